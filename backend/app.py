@@ -1,11 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
+from functools import wraps
+import hashlib
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from rag_backend import RAGBackend
+from config import Config
+from batcher import MicroBatcher
+from event_stream import EventBroadcaster
+from helper import categorize_tweets, process_tweet
+from ingest import Checkpoint, IngestPipeline, checkpointed, read_results
+from jobs import JobQueue, JobWorkerPool
+from model_manager import preload_shared_models
+from response_cache import ResponseCache
+import metrics
+from pagination import ORDER_CREATED, ORDER_UPDATED, encode_cursor, decode_cursor, parse_fields, parse_since, project, since_key
 import json
+from uuid import uuid4
 from datetime import datetime
-import threading
 import time
 
 # Load environment variables
@@ -13,16 +25,32 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app, origins=["*"])
+metrics.install_request_profiler(app)
 
 # Initialize RAG backend
 rag_backend = None
-global_events = []
-events_lock = threading.Lock()
+response_cache = ResponseCache(max_entries=Config.RESPONSE_CACHE_SIZE)
+
+# Groups tweets from concurrent requests into one classifier forward pass
+inference_scheduler = MicroBatcher(
+    categorize_tweets,
+    max_batch_size=Config.MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=Config.MICRO_BATCH_MAX_WAIT_MS,
+    name="inference-scheduler",
+)
+
+# Pushes added/updated events to /api/events/stream clients
+event_broadcaster = EventBroadcaster(
+    buffer_size=Config.EVENT_STREAM_BUFFER_SIZE,
+    poll_interval=Config.EVENT_STREAM_POLL_INTERVAL,
+    heartbeat=Config.EVENT_STREAM_HEARTBEAT,
+)
 
 def init_rag_backend():
     global rag_backend
     try:
         rag_backend = RAGBackend()
+        event_broadcaster.attach(rag_backend)
         print("RAG backend initialized successfully")
     except Exception as e:
         print(f"Error initializing RAG backend: {e}")
@@ -30,6 +58,145 @@ def init_rag_backend():
 # Initialize on startup
 init_rag_backend()
 
+# With gunicorn's preload_app this runs once in the master, before workers fork
+if Config.PRELOAD_MODELS:
+    preload_shared_models()
+
+def cached_read(view):
+    """Serve a read endpoint with an ETag and reuse its body until the store version changes"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not refresh_events():
+            return view(*args, **kwargs)
+
+        key = (request.path, request.query_string)
+        version = rag_backend.version
+        etag = f"{version}-{hashlib.sha1(repr(key).encode()).hexdigest()[:12]}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        body = response_cache.get(key, version)
+        if body is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            # Don't cache a body that may have been rendered from a newer version
+            if rag_backend.version == version:
+                response_cache.put(key, version, body)
+
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+    return wrapper
+
+def refresh_events():
+    """Catch up on other workers' writes; returns False when the backend is unavailable"""
+    if not rag_backend:
+        return False
+    rag_backend.refresh()
+    return True
+
+def current_events():
+    """Events from the shared store, after catching up on other workers' writes"""
+    if not refresh_events():
+        return []
+    return rag_backend.documents
+
+def current_facets():
+    if not refresh_events():
+        return {'categories': [], 'event_types': [], 'locations': []}
+    return rag_backend.facets()
+
+def classify_via_scheduler(tweet):
+    return inference_scheduler.submit(tweet).result(timeout=Config.MICRO_BATCH_TIMEOUT)
+
+def handle_tweet(tweet):
+    """Run one tweet through the pipeline; returns (response body, status code)"""
+    # Classification is batched with other in-flight requests
+    result = process_tweet(tweet, rag_backend, categorize=classify_via_scheduler)
+    if isinstance(result, str):
+        return {
+            'success': False,
+            'message': result
+        }, 400
+
+    event_data = rag_backend.get_document(result['id'])
+    
+    if event_data:
+        return {
+            'success': True,
+            'event': event_data,
+            'action': result['action'],
+            'message': 'Event extracted successfully'
+        }, 200
+    else:
+        return {
+            'success': False,
+            'message': 'Could not extract event information from tweet'
+        }, 400
+
+def run_tweets_job(payload):
+    """Run a /api/submitTweets batch through the ingest pipeline.
+
+    Progress is checkpointed like a bulk ingest, so if the job is handed to another
+    worker after a crash it resumes after the last flushed tweet.
+    """
+    tweets = payload['tweets']
+    base = os.path.join(Config.JOB_CHECKPOINT_DIR, payload['batch_id'])
+    checkpoint = Checkpoint(base + '.checkpoint.json')
+    os.makedirs(Config.JOB_CHECKPOINT_DIR, exist_ok=True)
+
+    pipeline = IngestPipeline(rag_backend)
+    remaining = ((i, tweet) for i, tweet in enumerate(tweets) if i >= checkpoint.watermark)
+    with open(base + '.results.jsonl', 'a', encoding='utf-8') as out:
+        for _ in checkpointed(pipeline.run(remaining), out, checkpoint, flush_every=Config.INGEST_BATCH_SIZE):
+            pass
+    done = read_results(base + '.results.jsonl')
+
+    for suffix in ('.checkpoint.json', '.results.jsonl'):
+        os.remove(base + suffix)
+    return {
+        'status_code': 200,
+        'response': {
+            'success': True,
+            'results': [done.get(i) for i in range(len(tweets))],
+            'stats': pipeline.throughput()
+        }
+    }
+
+def run_tweet_job(payload):
+    if 'tweets' in payload:
+        return run_tweets_job(payload)
+    body, status = handle_tweet(payload['tweet'])
+    return {'status_code': status, 'response': body}
+
+# Asynchronous submissions are queued in SQLite and run by a small pool in each worker
+job_queue = JobQueue(Config.JOB_DB_PATH, lease_seconds=Config.JOB_LEASE_SECONDS)
+job_pool = JobWorkerPool(job_queue, run_tweet_job, workers=Config.JOB_WORKERS)
+
+def enqueue_job(payload):
+    """Queue a job and return the 202 response pointing at its status and stream"""
+    job_id = job_queue.submit(payload)
+    job_pool.notify()
+    metrics.set_jobs_queued(job_queue.queued())
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'stream_url': f'/api/jobs/{job_id}/stream'
+    }), 202
+
+@app.before_request
+def start_job_pool():
+    job_pool.start()
+
+def wants_async(data):
+    flag = request.args.get('async') or str(data.get('async', ''))
+    return flag.lower() in ('1', 'true', 'yes')
+
 @app.route('/api/submitTweet', methods=['POST'])
 def submit_tweet():
     try:
@@ -41,26 +208,10 @@ def submit_tweet():
         
         # Process tweet with RAG backend
         if rag_backend:
-            event_data = rag_backend.process_tweet(tweet)
-            
-            if event_data:
-                # Add timestamp
-                event_data['timestamp'] = datetime.now().isoformat()
-                
-                # Add to global events
-                with events_lock:
-                    global_events.append(event_data)
-                
-                return jsonify({
-                    'success': True,
-                    'event': event_data,
-                    'message': 'Event extracted successfully'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': 'Could not extract event information from tweet'
-                }), 400
+            if wants_async(data):
+                return enqueue_job({'tweet': tweet})
+            body, status = handle_tweet(tweet)
+            return jsonify(body), status
         else:
             return jsonify({'error': 'RAG backend not initialized'}), 500
             
@@ -68,16 +219,142 @@ def submit_tweet():
         print(f"Error processing tweet: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        deadline = time.monotonic() + Config.JOB_STREAM_TIMEOUT
+        last_status = None
+        while True:
+            job = job_queue.get(job_id)
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: status\ndata: {json.dumps({'status': last_status})}\n\n"
+            if job['status'] in ('done', 'failed'):
+                yield f"event: result\ndata: {json.dumps(job)}\n\n"
+                return
+            if time.monotonic() > deadline:
+                # Stay under the gunicorn timeout; clients reconnect or fall back to polling
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            time.sleep(0.25)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/submitTweets', methods=['POST'])
+def submit_tweets():
+    try:
+        data = request.get_json()
+        tweets = data.get('tweets') if isinstance(data, dict) else None
+        
+        if not isinstance(tweets, list) or not tweets:
+            return jsonify({'error': 'No tweets provided'}), 400
+        if len(tweets) > Config.BULK_MAX_TWEETS:
+            return jsonify({'error': f'At most {Config.BULK_MAX_TWEETS} tweets per request'}), 400
+        if not rag_backend:
+            return jsonify({'error': 'RAG backend not initialized'}), 500
+        
+        # A batch can take minutes of LLM calls, so it always runs as a job
+        return enqueue_job({'tweets': [str(tweet) for tweet in tweets], 'batch_id': str(uuid4())})
+    except Exception as e:
+        print(f"Error processing tweets: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/events/stream', methods=['GET'])
+def stream_events():
+    if not rag_backend:
+        return jsonify({'error': 'RAG backend not initialized'}), 500
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    event_broadcaster.start()
+    # Bounded like the job stream so sync workers stay under the gunicorn timeout;
+    # EventSource reconnects with Last-Event-ID and resumes from the replay buffer
+    frames = event_broadcaster.subscribe(last_event_id, timeout=Config.EVENT_STREAM_TIMEOUT)
+    return Response(frames, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/events/streamStats', methods=['GET'])
+def get_event_stream_stats():
+    return jsonify(event_broadcaster.stats())
+
+@app.route('/api/inferenceStats', methods=['GET'])
+def get_inference_stats():
+    return jsonify(inference_scheduler.stats())
+
+def wants_page():
+    return any(arg in request.args for arg in ('limit', 'cursor', 'since', 'fields'))
+
+def events_page(category=None, event_type=None, location=None):
+    """Paged listing for limit/cursor/since/fields requests"""
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        limit = int(request.args.get('limit', Config.PAGE_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    limit = min(limit, Config.PAGE_MAX_LIMIT)
+
+    cursor = request.args.get('cursor')
+    since = request.args.get('since')
+    if since:
+        try:
+            since = parse_since(since)
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO-8601 timestamp'}), 400
+    if cursor:
+        try:
+            order, after = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    elif since:
+        order, after = ORDER_UPDATED, since_key(since)
+    else:
+        order, after = ORDER_CREATED, None
+
+    if not refresh_events():
+        return jsonify({'events': [], 'next_cursor': None, 'next_since': since})
+
+    events, last_key, has_more = rag_backend.page_events(
+        order, after=after, limit=limit, category=category, event_type=event_type, location=location)
+
+    next_since = since
+    if order == ORDER_UPDATED and last_key:
+        next_since = last_key[0]
+    return jsonify({
+        'events': [project(e, fields) for e in events],
+        'next_cursor': encode_cursor(order, last_key) if has_more else None,
+        'next_since': next_since,
+    })
+
 @app.route('/api/allEvents', methods=['GET'])
+@cached_read
 def get_all_events():
     try:
-        with events_lock:
-            return jsonify(global_events)
+        if wants_page():
+            return events_page()
+        return jsonify(current_events())
     except Exception as e:
         print(f"Error getting events: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/events', methods=['GET'])
+@cached_read
 def get_events():
     try:
         # Get query parameters
@@ -85,74 +362,59 @@ def get_events():
         location = request.args.get('location')
         event_type = request.args.get('event_type')
         
-        with events_lock:
-            filtered_events = global_events.copy()
-            
-            # Apply filters
-            if category:
-                filtered_events = [e for e in filtered_events if e.get('category') == category]
-            if location:
-                filtered_events = [e for e in filtered_events if location.lower() in e.get('locations', '').lower()]
-            if event_type:
-                filtered_events = [e for e in filtered_events if e.get('event_type') == event_type]
-            
-            return jsonify(filtered_events)
+        if wants_page():
+            return events_page(category=category, event_type=event_type, location=location)
+        if not refresh_events():
+            return jsonify([])
+        
+        # Filters are answered from the inverted indexes
+        filtered_events = rag_backend.query_events(category=category, event_type=event_type, location=location)
+        return jsonify(filtered_events)
     except Exception as e:
         print(f"Error filtering events: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/categories', methods=['GET'])
+@cached_read
 def get_categories():
     try:
-        with events_lock:
-            categories = list(set([e.get('category') for e in global_events if e.get('category')]))
-            return jsonify(categories)
+        return jsonify(current_facets()['categories'])
     except Exception as e:
         print(f"Error getting categories: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/locations', methods=['GET'])
+@cached_read
 def get_locations():
     try:
-        with events_lock:
-            all_locations = []
-            for event in global_events:
-                if event.get('locations'):
-                    locations = [loc.strip() for loc in event['locations'].split(',')]
-                    all_locations.extend(locations)
-            unique_locations = list(set(all_locations))
-            return jsonify(unique_locations)
+        return jsonify(current_facets()['locations'])
     except Exception as e:
         print(f"Error getting locations: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/eventTypes', methods=['GET'])
+@cached_read
 def get_event_types():
     try:
-        with events_lock:
-            event_types = list(set([e.get('event_type') for e in global_events if e.get('event_type')]))
-            return jsonify(event_types)
+        return jsonify(current_facets()['event_types'])
     except Exception as e:
         print(f"Error getting event types: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/stats', methods=['GET'])
+@cached_read
 def get_stats():
     try:
-        with events_lock:
-            total_events = len(global_events)
-            categories = len(set([e.get('category') for e in global_events if e.get('category')]))
-            locations = set()
-            for event in global_events:
-                if event.get('locations'):
-                    locations.update([loc.strip() for loc in event['locations'].split(',')])
-            
-            return jsonify({
-                'total_events': total_events,
-                'categories': categories,
-                'locations': len(locations),
-                'last_updated': datetime.now().isoformat()
-            })
+        facets = current_facets()
+        total_events = len(rag_backend.doc_index) if rag_backend else 0
+        
+        return jsonify({
+            'total_events': total_events,
+            'categories': len(facets['categories']),
+            'locations': len(facets['locations']),
+            # From the data, not the clock: the body is cached until the store changes
+            'last_updated': rag_backend.last_updated() if rag_backend else None
+        })
     except Exception as e:
         print(f"Error getting stats: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -162,5 +424,7 @@ def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
 if __name__ == '__main__':
+    # Under gunicorn the master serves metrics (see gunicorn.conf.py)
+    metrics.start_metrics_server()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+class MicroBatcher:
+    """Collects items from concurrent callers and runs them through batch_fn together.
+
+    A batch is flushed when it reaches max_batch_size or when the oldest item has
+    waited max_wait_ms, whichever comes first. With eager=True a batch is flushed as
+    soon as the queue is empty instead, so a lone caller never waits; items arriving
+    while batch_fn runs still form the next batch. batch_fn receives a list of items
+    and must return a list of results in the same order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name="micro-batcher", eager=False):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.eager = eager
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._last_batch_size = 0
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so gunicorn workers each start their own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        metrics.set_queue_depth(self.name, self._queue.qsize())
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self.eager and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            metrics.set_queue_depth(self.name, self._queue.qsize())
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Queue depth and batch-size counters for this process"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+                'last_batch_size': self._last_batch_size,
+                'largest_batch_size': self._largest_batch,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
@@ -0,0 +1,324 @@
+"""Offline latency/throughput benchmark for the tweet pipeline and the read API.
+
+Runs against a synthetic tweet corpus with the rule-based LLM backend, a hashing
+stand-in for the sentence transformer and a throwaway Chroma directory and event log,
+so results are reproducible and nothing touches the network or the real data.
+
+Usage:
+    python benchmark.py                                  # all stages, reads at 1k/10k/100k events
+    python benchmark.py --tweets 500 --sizes 1000,10000 --output results.json
+    python benchmark.py --compare benchmark_results/previous.json
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+EVENT_TYPES = ["Earthquake", "Flood", "Hurricane", "Wildfire", "Cyclone", "Landslide", "Tornado", "Tsunami"]
+LOCATIONS = [
+    "Kathmandu", "Chennai", "Houston", "Manila", "Jakarta", "Lisbon", "Puerto Rico", "Assam",
+    "Kerala", "Mexico City", "Sendai", "Haiti", "Mozambique", "California", "Izmir", "Dhaka",
+]
+CATEGORIES = [
+    "affected_individuals", "infrastructure_and_utility_damage", "injured_or_dead_people",
+    "missing_or_found_people", "other_relevant_information", "rescue_volunteering_or_donation_effort",
+]
+INFORMATIVE_TEMPLATES = [
+    "{event} hits {location}, {killed} people killed and {trapped} trapped under rubble",
+    "Massive {event} in {location} has destroyed roads and bridges #{event}",
+    "RT @news: {killed} dead after {event} near {location}, rescue teams on the way",
+    "Volunteers needed in {location} after the {event}, {trapped} people still missing",
+    "Power outage across {location} following the {event} http://t.co/{tag}",
+]
+NOISE_TEMPLATES = [
+    "can't believe how good this coffee is lol",
+    "my playlist for the weekend is a total {event} of bangers",
+    "who's watching the game tonight? #{tag}",
+    "traffic in {location} is a disaster again this morning smh",
+    "new blog post is up http://t.co/{tag}",
+]
+
+
+def synthetic_tweets(count, seed=0, informative_share=0.4):
+    rng = random.Random(seed)
+    tweets = []
+    for _ in range(count):
+        templates = INFORMATIVE_TEMPLATES if rng.random() < informative_share else NOISE_TEMPLATES
+        tweets.append(rng.choice(templates).format(
+            event=rng.choice(EVENT_TYPES).lower(),
+            location=rng.choice(LOCATIONS),
+            killed=rng.randint(1, 300),
+            trapped=rng.randint(1, 100),
+            tag=rng.randint(10 ** 5, 10 ** 6),
+        ))
+    return tweets
+
+
+def synthetic_event(rng, created):
+    event_type = rng.choice(EVENT_TYPES)
+    locations = rng.sample(LOCATIONS, rng.randint(1, 2))
+    timestamp = created.isoformat()
+    return {
+        "id": f"{rng.getrandbits(128):032x}",
+        "event_type": event_type,
+        "locations": ", ".join(locations),
+        "people_killed": rng.randint(0, 300),
+        "people_trapped": rng.randint(0, 100),
+        "infrastructure_damage": "Roads and bridges damaged",
+        "summary": f"{event_type} in {' and '.join(locations)} with reported casualties and damage.",
+        "category": rng.choice(CATEGORIES),
+        "created_at": timestamp,
+        "timestamp": timestamp,
+    }
+
+
+class HashingEmbedder:
+    """Deterministic stand-in for the sentence transformer (unit-length bag of hashed words)"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts):
+        import numpy as np
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+                vectors[row, h % self.dim] += 1.0 if (h >> 63) else -1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+def summarize(latencies_ms, wall_seconds=None):
+    """p50/p95/p99/mean latency in ms and items per second"""
+    if not latencies_ms:
+        return {"count": 0}
+    ordered = sorted(latencies_ms)
+
+    def pct(p):
+        # Nearest-rank percentile
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 3)
+
+    wall_seconds = wall_seconds if wall_seconds is not None else sum(ordered) / 1000
+    return {
+        "count": len(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "per_second": round(len(ordered) / wall_seconds, 2) if wall_seconds else None,
+    }
+
+
+def timed(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def configure_environment(workdir):
+    """Point every store at workdir and select offline backends; must run before importing app"""
+    os.environ.update({
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "EVENT_STORE": "log",
+        "EVENT_LOG_PATH": os.path.join(workdir, "events.log.jsonl"),
+        "EVENT_STORE_PATH": os.path.join(workdir, "events.json"),
+        "EVENT_LOG_FSYNC": "never",
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "LLM_BACKEND": "local",
+        "INFERENCE_SERVER_ADDRESS": "",
+        "PRELOAD_MODELS": "False",
+        "DEDUP_ENABLED": "False",
+        "GATE_ENABLED": "False",
+    })
+
+
+def bench_classifiers(tweets):
+    from config import Config
+    from helper import binary_classifier, humanitarianClassifier
+
+    results = {}
+    missing = [path for path in (Config.BINARY_MODEL_PATH, Config.MULTI_CLASS_MODEL_PATH) if not os.path.exists(path)]
+    if missing:
+        reason = f"model not found: {', '.join(missing)}"
+        print(f"Skipping classifier stages ({reason})")
+        return {"binary_classifier": {"skipped": reason}, "humanitarianClassifier": {"skipped": reason}}
+
+    binary_classifier(tweets[0])  # load models before timing
+    results["binary_classifier"] = timed(binary_classifier, tweets)
+    results["humanitarianClassifier"] = timed(humanitarianClassifier, tweets)
+    return results
+
+
+def bench_process_event(tweets, db_path):
+    from helper import call_gpt_extractor
+    from rag_backend import RAGBackend
+
+    # The offline extractor stands in for call_gpt_extractor's OpenAI call
+    events = []
+    extract = timed(lambda tweet: events.append(call_gpt_extractor(f"{tweet}, Category: other_relevant_information")), tweets)
+    rag = RAGBackend(db_path=db_path)
+    rag.process_event(events[0])
+    return {
+        "call_gpt_extractor": extract,
+        "RAGBackend.process_event": timed(rag.process_event, events[1:]),
+    }
+
+
+READ_ENDPOINTS = [
+    "/api/allEvents",
+    "/api/allEvents?limit=100",
+    "/api/events?event_type=Flood",
+    "/api/events?location=Chennai&limit=100",
+    "/api/categories",
+    "/api/locations",
+    "/api/eventTypes",
+    "/api/stats",
+]
+
+
+def write_event_log(path, count, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for seq in range(1, count + 1):
+            doc = synthetic_event(rng, start + timedelta(minutes=seq))
+            f.write(json.dumps({"seq": seq, "op": "add", "id": doc["id"], "doc": doc}) + "\n")
+
+
+def bench_reads(sizes, iterations, workdir):
+    import app as app_module
+    from config import Config
+    from rag_backend import RAGBackend
+    from response_cache import ResponseCache
+
+    client = app_module.app.test_client()
+    results = {}
+    for size in sizes:
+        log_path = os.path.join(workdir, f"events-{size}.log.jsonl")
+        write_event_log(log_path, size)
+        Config.EVENT_LOG_PATH = log_path
+        t0 = time.perf_counter()
+        app_module.rag_backend = RAGBackend(json_path=os.path.join(workdir, "none.json"),
+                                            db_path=os.path.join(workdir, f"chroma-{size}"))
+        load_ms = (time.perf_counter() - t0) * 1000
+        print(f"Loaded {size} events in {load_ms:.0f} ms")
+
+        endpoints = {}
+        for url in READ_ENDPOINTS:
+            # A zero-size cache renders every request; the default cache shows the repeat-read path
+            for label, cache in (("uncached", ResponseCache(max_entries=0)), ("cached", ResponseCache())):
+                app_module.response_cache = cache
+
+                def get(_):
+                    response = client.get(url)
+                    assert response.status_code == 200, f"{url} returned {response.status_code}"
+                    response.get_data()
+
+                get(None)
+                endpoints[f"{url} ({label})"] = timed(get, range(iterations))
+        results[str(size)] = {"load_ms": round(load_ms, 1), "endpoints": endpoints}
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    """Print p50/p95 changes of every measurement present in both runs"""
+    def flatten(results):
+        rows = {f"stage {name}": stats for name, stats in results.get("stages", {}).items()}
+        for size, data in results.get("reads", {}).items():
+            for url, stats in data["endpoints"].items():
+                rows[f"reads@{size} {url}"] = stats
+        return rows
+
+    old = flatten(previous)
+    for name, stats in flatten(current).items():
+        before = old.get(name)
+        if not before or "p50_ms" not in stats or "p50_ms" not in before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms"):
+            delta = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0
+            changes.append(f"{key} {before[key]} -> {stats[key]} ({delta:+.1f}%)")
+        print(f"{name}: {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the tweet pipeline and read endpoints")
+    parser.add_argument("--tweets", type=int, default=200, help="Synthetic tweets per pipeline stage")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Store sizes for the read benchmark")
+    parser.add_argument("--read-iterations", type=int, default=20)
+    parser.add_argument("--stages", default="classify,process,reads", help="Comma-separated subset to run")
+    parser.add_argument("--real-embedder", action="store_true", help="Use the sentence transformer instead of the hashing stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results file (default: benchmark_results/benchmark-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crisisinfo-bench-")
+    configure_environment(workdir)
+    stages = set(args.stages.split(","))
+    try:
+        import rag_backend
+        if not args.real_embedder:
+            rag_backend._model_instance = HashingEmbedder()
+
+        tweets = synthetic_tweets(args.tweets, seed=args.seed)
+        results = {
+            "meta": {
+                "started_at": datetime.now().isoformat(),
+                "git_commit": git_commit(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "embedder": "sentence-transformer" if args.real_embedder else "hashing-stub",
+                "args": vars(args),
+            },
+            "stages": {},
+            "reads": {},
+        }
+        if "classify" in stages:
+            results["stages"].update(bench_classifiers(tweets))
+        if "process" in stages:
+            results["stages"].update(bench_process_event(tweets, os.path.join(workdir, "chroma-process")))
+        if "reads" in stages:
+            sizes = [int(size) for size in args.sizes.split(",") if size]
+            results["reads"] = bench_reads(sizes, args.read_iterations, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join("benchmark_results", f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({"stages": results["stages"]}, indent=2))
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,14 +18,89 @@ class Config:
     # Database
     #DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///events.db')
     CHROMA_DB_PATH = os.environ.get('CHROMA_DB_PATH', './chroma_db')
+    # Set to use a Chroma server shared by every worker instead of the embedded database
+    CHROMA_SERVER_HOST = os.environ.get('CHROMA_SERVER_HOST', '')
+    CHROMA_SERVER_PORT = int(os.environ.get('CHROMA_SERVER_PORT', 8000))
+    
+    # Event document store: 'log' (append-only) or 'json' (whole-file rewrite)
+    EVENT_STORE = os.environ.get('EVENT_STORE', 'log')
+    EVENT_STORE_PATH = os.environ.get('EVENT_STORE_PATH', './events.json')
+    EVENT_LOG_PATH = os.environ.get('EVENT_LOG_PATH', './events.log.jsonl')
+    EVENT_LOG_FSYNC = os.environ.get('EVENT_LOG_FSYNC', 'interval')  # always, interval or never
+    EVENT_LOG_FSYNC_INTERVAL = float(os.environ.get('EVENT_LOG_FSYNC_INTERVAL', 1.0))
+    EVENT_LOG_COMPACT_INTERVAL = float(os.environ.get('EVENT_LOG_COMPACT_INTERVAL', 300))
+    # Group commit: matches and writes are batched per worker under a cross-process lock
+    COMMIT_MAX_BATCH = int(os.environ.get('COMMIT_MAX_BATCH', 64))
+    COMMIT_MAX_WAIT_MS = float(os.environ.get('COMMIT_MAX_WAIT_MS', 5))
     
     # OpenAI
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-    #OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4')
+    
+    # LLM extraction client ('openai', or 'local' for the offline stand-in)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_RETRY_BACKOFF = float(os.environ.get('LLM_RETRY_BACKOFF', 0.5))
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', 4096))
     
     # Model Paths
     BINARY_MODEL_PATH = os.environ.get('BINARY_MODEL_PATH', './models/binary_model')
     MULTI_CLASS_MODEL_PATH = os.environ.get('MULTI_CLASS_MODEL_PATH', './models/multi-class-humanitarian_model')
+    CLASSIFIER_BATCH_SIZE = int(os.environ.get('CLASSIFIER_BATCH_SIZE', 64))
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')  # torch, quantized (int8) or onnx
+    
+    # Load models in the gunicorn master and share their weights with forked workers
+    PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', 'False').lower() == 'true'
+    TORCH_THREADS_PER_WORKER = int(os.environ.get('TORCH_THREADS_PER_WORKER', 0))  # 0 = cpu_count // workers
+    
+    # Dedicated inference server ('unix:/path.sock' or 'host:port'); empty = run models in each worker
+    INFERENCE_SERVER_ADDRESS = os.environ.get('INFERENCE_SERVER_ADDRESS', '')
+    INFERENCE_SERVER_AUTHKEY = os.environ.get('INFERENCE_SERVER_AUTHKEY', '')
+    INFERENCE_SERVER_BATCH_SIZE = int(os.environ.get('INFERENCE_SERVER_BATCH_SIZE', 32))
+    
+    # Micro-batching for /api/submitTweet classification
+    MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 16))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 10))
+    MICRO_BATCH_TIMEOUT = float(os.environ.get('MICRO_BATCH_TIMEOUT', 20))
+    
+    # Early-exit gate in front of the binary classifier (train with `python gate.py train`)
+    GATE_ENABLED = os.environ.get('GATE_ENABLED', 'False').lower() == 'true'
+    GATE_MODEL_PATH = os.environ.get('GATE_MODEL_PATH', './models/gate.pkl')
+    GATE_THRESHOLD = float(os.environ.get('GATE_THRESHOLD', 0.95))  # P(non-informative) needed to skip BERT
+    
+    # Near-duplicate tweet pre-filter
+    DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'True').lower() == 'true'
+    DEDUP_MAX_ENTRIES = int(os.environ.get('DEDUP_MAX_ENTRIES', 10000))
+    DEDUP_MAX_DISTANCE = int(os.environ.get('DEDUP_MAX_DISTANCE', 3))
+    
+    # Matching new events against stored ones (same type and location, recently updated)
+    DEDUP_TIME_WINDOW_HOURS = float(os.environ.get('DEDUP_TIME_WINDOW_HOURS', 72))  # 0 = no time limit
+    HOT_INDEX_SIZE = int(os.environ.get('HOT_INDEX_SIZE', 2000))
+    
+    # Bulk ingest pipeline (ingest.py and /api/submitTweets)
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 32))
+    INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 256))
+    BULK_MAX_TWEETS = int(os.environ.get('BULK_MAX_TWEETS', 1000))
+    
+    # Asynchronous /api/submitTweet and /api/submitTweets jobs
+    JOB_DB_PATH = os.environ.get('JOB_DB_PATH', './jobs.db')
+    JOB_CHECKPOINT_DIR = os.environ.get('JOB_CHECKPOINT_DIR', './job_checkpoints')  # batch job progress
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 120))
+    JOB_STREAM_TIMEOUT = float(os.environ.get('JOB_STREAM_TIMEOUT', 25))
+    
+    # Event listing pagination
+    PAGE_DEFAULT_LIMIT = int(os.environ.get('PAGE_DEFAULT_LIMIT', 100))
+    PAGE_MAX_LIMIT = int(os.environ.get('PAGE_MAX_LIMIT', 1000))
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+    
+    # Live event stream (/api/events/stream)
+    EVENT_STREAM_BUFFER_SIZE = int(os.environ.get('EVENT_STREAM_BUFFER_SIZE', 1000))
+    EVENT_STREAM_POLL_INTERVAL = float(os.environ.get('EVENT_STREAM_POLL_INTERVAL', 0.5))
+    EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))
+    EVENT_STREAM_TIMEOUT = float(os.environ.get('EVENT_STREAM_TIMEOUT', 25))  # 0 = no limit (gevent workers)
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -46,6 +121,14 @@ class Config:
     # Monitoring
     ENABLE_MONITORING = os.environ.get('ENABLE_MONITORING', 'True').lower() == 'true'
     METRICS_PORT = int(os.environ.get('METRICS_PORT', 9090))
+    # Only used under gunicorn; absolute so workers agree regardless of their cwd
+    METRICS_MULTIPROC_DIR = os.path.abspath(os.environ.get(
+        'METRICS_MULTIPROC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics_multiproc')))
+    
+    # Per-request cProfile dumps (always, or only for requests sending "X-Profile: 1")
+    PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False').lower() == 'true'
+    PROFILE_ON_HEADER = os.environ.get('PROFILE_ON_HEADER', 'False').lower() == 'true'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', './profiles')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
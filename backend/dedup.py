@@ -0,0 +1,111 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import Config
+from llm_client import normalize_tweet
+
+# Global index shared by every request in the process
+_index_instance = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index():
+    """Get or create the process-wide near-duplicate index, or None when disabled"""
+    global _index_instance
+    if not Config.DEDUP_ENABLED:
+        return None
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = NearDuplicateIndex(
+                    max_entries=Config.DEDUP_MAX_ENTRIES,
+                    max_distance=Config.DEDUP_MAX_DISTANCE,
+                )
+    return _index_instance
+
+
+def _features(text):
+    tokens = normalize_tweet(text).split()
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def simhash(text, bits=64):
+    """64-bit SimHash of a tweet's normalized words and word pairs"""
+    weights = [0] * bits
+    for feature in _features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for i in range(bits):
+            weights[i] += 1 if (h >> i) & 1 else -1
+    fingerprint = 0
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+class NearDuplicateIndex:
+    """Bounded LRU of recent tweet fingerprints with banded lookup.
+
+    Fingerprints are split into max_distance + 1 bands, so any two fingerprints within
+    max_distance bits share at least one identical band and are found with a handful
+    of dict lookups instead of a scan.
+    """
+
+    def __init__(self, max_entries=10000, max_distance=3, bits=64):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.bits = bits
+        self.band_count = max_distance + 1
+        self.band_bits = bits // self.band_count
+
+        self._entries = OrderedDict()  # fingerprint -> payload
+        self._bands = [dict() for _ in range(self.band_count)]  # band value -> fingerprints
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (i * self.band_bits)) & mask for i in range(self.band_count)]
+
+    def lookup(self, text):
+        """Payload stored for the closest recent near-duplicate of text, or None"""
+        fingerprint = simhash(text, self.bits)
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            for band, value in zip(self._bands, self._band_values(fingerprint)):
+                for candidate in band.get(value, ()):
+                    distance = bin(candidate ^ fingerprint).count("1")
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best]
+
+    def add(self, text, payload):
+        fingerprint = simhash(text, self.bits)
+        with self._lock:
+            if fingerprint not in self._entries:
+                for band, value in zip(self._bands, self._band_values(fingerprint)):
+                    band.setdefault(value, set()).add(fingerprint)
+            self._entries[fingerprint] = payload
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        fingerprint, _ = self._entries.popitem(last=False)
+        for band, value in zip(self._bands, self._band_values(fingerprint)):
+            members = band.get(value)
+            if members is not None:
+                members.discard(fingerprint)
+                if not members:
+                    del band[value]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,175 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import count
+
+
+def normalize_location(name):
+    """Case- and whitespace-insensitive key for a location name"""
+    return " ".join(str(name).lower().split())
+
+
+def split_locations(value):
+    """Split an event's comma-separated (or list) locations field"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        parts = value
+    else:
+        parts = str(value).split(',')
+    return [str(part).strip() for part in parts if str(part).strip()]
+
+
+def _facet_value(value):
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+class EventIndex:
+    """Inverted indexes and facet counts over event documents.
+
+    Kept up to date incrementally by RAGBackend on every add, update and delete,
+    so filters and facet lists cost proportional to their result rather than to
+    the number of stored events.
+    """
+
+    def __init__(self):
+        self.by_category = defaultdict(set)
+        self.by_event_type = defaultdict(set)
+        self.by_location = defaultdict(set)
+        # normalized location -> display name -> number of events using it
+        self.location_names = defaultdict(lambda: defaultdict(int))
+        # id -> arrival order, so results come back in store order
+        self.order = {}
+        self._counter = count()
+        # Sorted (created_at, id) and (timestamp, id) keys for cursor paging
+        self.created_keys = []
+        self.updated_keys = []
+        self.sort_keys = {}
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, doc):
+        doc_id = doc["id"]
+        if doc_id not in self.order:
+            self.order[doc_id] = next(self._counter)
+
+        created_key = (str(doc.get("created_at") or ""), doc_id)
+        updated_key = (str(doc.get("timestamp") or ""), doc_id)
+        insort(self.created_keys, created_key)
+        insort(self.updated_keys, updated_key)
+        self.sort_keys[doc_id] = (created_key, updated_key)
+
+        category = _facet_value(doc.get("category"))
+        if category is not None:
+            self.by_category[category].add(doc_id)
+        event_type = _facet_value(doc.get("event_type"))
+        if event_type is not None:
+            self.by_event_type[event_type].add(doc_id)
+        for name in split_locations(doc.get("locations")):
+            key = normalize_location(name)
+            self.by_location[key].add(doc_id)
+            self.location_names[key][name] += 1
+
+    def remove(self, doc, keep_order=False):
+        doc_id = doc["id"]
+        if not keep_order:
+            self.order.pop(doc_id, None)
+
+        keys = self.sort_keys.pop(doc_id, None)
+        if keys is not None:
+            self._remove_key(self.created_keys, keys[0])
+            self._remove_key(self.updated_keys, keys[1])
+
+        self._discard(self.by_category, _facet_value(doc.get("category")), doc_id)
+        self._discard(self.by_event_type, _facet_value(doc.get("event_type")), doc_id)
+        for name in split_locations(doc.get("locations")):
+            key = normalize_location(name)
+            self._discard(self.by_location, key, doc_id)
+            names = self.location_names.get(key)
+            if names is not None:
+                names[name] -= 1
+                if names[name] <= 0:
+                    del names[name]
+                if not names:
+                    del self.location_names[key]
+
+    @staticmethod
+    def _remove_key(keys, key):
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    @staticmethod
+    def _discard(index, key, doc_id):
+        if key is None:
+            return
+        ids = index.get(key)
+        if ids is None:
+            return
+        ids.discard(doc_id)
+        if not ids:
+            del index[key]
+
+    def match_location(self, location):
+        """Ids of events at a location; falls back to substring match over distinct locations"""
+        key = normalize_location(location)
+        if key in self.by_location:
+            return set(self.by_location[key])
+        ids = set()
+        for name, name_ids in self.by_location.items():
+            if key in name:
+                ids |= name_ids
+        return ids
+
+    def query(self, category=None, event_type=None, location=None):
+        """Ids matching every given filter, in arrival order; None when no filter is given"""
+        candidates = []
+        if category:
+            candidates.append(self.by_category.get(category, set()))
+        if event_type:
+            candidates.append(self.by_event_type.get(event_type, set()))
+        if location:
+            candidates.append(self.match_location(location))
+        if not candidates:
+            return None
+
+        candidates.sort(key=len)
+        ids = set(candidates[0])
+        for other in candidates[1:]:
+            ids &= other
+        return sorted(ids, key=self.order.__getitem__)
+
+    def page(self, order, after=None, limit=100, ids=None):
+        """Up to limit ids sorted by order ('created' or 'updated') strictly after the key `after`.
+
+        Returns (ids, last_key, has_more). When ids is given, only those ids are paged.
+        """
+        position = 0 if order == 'created' else 1
+        if ids is None:
+            keys = self.created_keys if position == 0 else self.updated_keys
+            start = bisect_right(keys, tuple(after)) if after is not None else 0
+            window = keys[start:start + limit + 1]
+        else:
+            window = [self.sort_keys[doc_id][position] for doc_id in ids]
+            if after is not None:
+                after = tuple(after)
+                window = [key for key in window if key > after]
+            window.sort()
+            window = window[:limit + 1]
+
+        has_more = len(window) > limit
+        window = window[:limit]
+        last_key = window[-1] if window else None
+        return [doc_id for _, doc_id in window], last_key, has_more
+
+    def categories(self):
+        return list(self.by_category)
+
+    def event_types(self):
+        return list(self.by_event_type)
+
+    def locations(self):
+        # Most common spelling stands in for each normalized location
+        return [max(names, key=names.get) for names in self.location_names.values()]
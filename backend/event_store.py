@@ -0,0 +1,344 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+def open_event_store(config, json_path=None):
+    """Build the document store selected by config.EVENT_STORE"""
+    json_path = json_path or config.EVENT_STORE_PATH
+    if config.EVENT_STORE == 'json':
+        return JsonFileStore(json_path)
+    return EventLog(
+        config.EVENT_LOG_PATH,
+        fsync_policy=config.EVENT_LOG_FSYNC,
+        fsync_interval=config.EVENT_LOG_FSYNC_INTERVAL,
+        compact_interval=config.EVENT_LOG_COMPACT_INTERVAL,
+        legacy_json_path=json_path,
+    )
+
+
+def apply_record(docs, record):
+    """Apply one log record to an id -> document dict"""
+    op = record.get("op")
+    if op in ("add", "update"):
+        docs[record["id"]] = record["doc"]
+    elif op == "delete":
+        docs.pop(record["id"], None)
+
+
+class FileLock:
+    """Exclusive lock shared by threads and processes (flock on a side file); reentrant per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            # A descriptor inherited over fork shares the parent's lock, so open one per process
+            if self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+class JsonFileStore:
+    """Legacy store: the whole document list is rewritten on every mutation"""
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self._mtime = None
+        self._stale = False
+        self.write_lock = FileLock(path + ".lock")
+
+    def locked(self):
+        """Hold the store's cross-process write lock"""
+        return self.write_lock
+
+    def _read(self):
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            with self.write_lock:
+                if not os.path.exists(self.path):
+                    with open(self.path, "w") as f:
+                        json.dump([], f)
+        self._mtime = self.seq = os.stat(self.path).st_mtime_ns
+        self._stale = False
+        return self._read()
+
+    def append(self, op, doc_id, doc=None):
+        self.append_many([{"op": op, "id": doc_id, "doc": doc}])
+
+    def append_many(self, records):
+        with self.write_lock:
+            # Merge into what is on disk now, so another worker's rewrite is never lost
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self._stale = True
+            docs = {doc["id"]: doc for doc in self._read()}
+            for record in records:
+                apply_record(docs, record)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(list(docs.values()), f, indent=2)
+            os.replace(tmp_path, self.path)
+            # The file's mtime doubles as a version every process agrees on
+            self._mtime = self.seq = os.stat(self.path).st_mtime_ns
+
+    def poll(self):
+        """Return None when another process rewrote the file, else no records"""
+        if self._stale or os.stat(self.path).st_mtime_ns != self._mtime:
+            return None
+        return []
+
+
+class EventLog:
+    """Append-only JSON-lines store with one record per add, update or delete.
+
+    Each record carries a ``seq`` that increases across all processes: writers hold an
+    flock on ``<path>.lock`` and catch up with the file before numbering their records.
+    Every process tails the same file with ``poll()``, so workers see each other's
+    writes incrementally. The log is compacted in the background by replaying it into
+    the live documents and atomically replacing the file, so startup replay stays
+    proportional to the number of events.
+    """
+
+    FSYNC_POLICIES = ('always', 'interval', 'never')
+
+    def __init__(self, path, fsync_policy='interval', fsync_interval=1.0,
+                 compact_interval=300, compact_min_records=1000, legacy_json_path=None):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}', expected one of {self.FSYNC_POLICIES}")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.compact_interval = compact_interval
+        self.compact_min_records = compact_min_records
+        self.legacy_json_path = legacy_json_path
+
+        self.seq = 0
+        # Records in the current file and the ids they leave live, from what this process
+        # has replayed (its own appends included once tailed), for the compaction check
+        self._records = 0
+        self._live_ids = set()
+        self._dirty = False
+        self._last_compact = time.monotonic()
+
+        # Read position of this process and the inode it belongs to
+        self._offset = 0
+        self._ino = None
+
+        self._lock = threading.Lock()
+        self.write_lock = FileLock(path + ".lock")
+        # Other processes' records read while catching up, not yet handed out by poll()
+        self._pending = []
+        self._file = None
+        self._file_ino = None
+        self._pid = None
+        self._thread = None
+
+    def locked(self):
+        """Hold the log's cross-process write lock; nothing else can append or compact meanwhile"""
+        return self.write_lock
+
+    def load(self):
+        """Replay the log into an ordered list of live documents"""
+        # Readers never take the write lock; it's only needed to create the file
+        if not os.path.exists(self.path):
+            with self.write_lock, self._lock:
+                if not os.path.exists(self.path):
+                    self._write_compacted(self._load_legacy())
+        with self._lock:
+            docs = {}
+            self._pending = []
+            self._offset = 0
+            self._ino = os.stat(self.path).st_ino
+            self._records = 0
+            self._live_ids = set()
+            for record in self._read_new():
+                apply_record(docs, record)
+            return list(docs.values())
+
+    def _load_legacy(self):
+        if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            with open(self.legacy_json_path, "r") as f:
+                docs = json.load(f)
+            print(f"Importing {len(docs)} events from {self.legacy_json_path} into {self.path}")
+            return docs
+        return []
+
+    def _read_new(self):
+        """Read complete records past this process's offset"""
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Another process is mid-write; pick it up on the next poll
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write from a crash; skip it
+                    print(f"Skipping corrupt record in {self.path} at byte {self._offset}")
+                    self._offset += len(line)
+                    continue
+                self._offset += len(line)
+                self._records += 1
+                if record.get("op") in ("add", "update"):
+                    self._live_ids.add(record["id"])
+                elif record.get("op") == "delete":
+                    self._live_ids.discard(record["id"])
+                self.seq = max(self.seq, record.get("seq", 0))
+                records.append(record)
+        return records
+
+    def poll(self):
+        """Return records appended since the last poll, or None if the log was replaced"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return []
+            if st.st_ino != self._ino:
+                self._pending = []
+                return None
+            records, self._pending = self._pending, []
+            if st.st_size > self._offset:
+                records.extend(self._read_new())
+            return records
+
+    def _catch_up(self):
+        # Called with the write lock held: learn the newest seq before numbering our records
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino == self._ino:
+            self._pending.extend(self._read_new())
+            return
+        # Replaced by a compaction; poll() will report a reload, we only need the seq
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    self.seq = max(self.seq, json.loads(line).get("seq", 0))
+                except ValueError:
+                    continue
+
+    def _ensure_open(self):
+        # File handles and threads are per process; reopen after a fork or a compaction
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file = None
+            self._thread = threading.Thread(target=self._maintenance, name="event-log", daemon=True)
+            self._thread.start()
+        st_ino = os.stat(self.path).st_ino if os.path.exists(self.path) else None
+        if self._file is None or self._file_ino != st_ino:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._file_ino = os.fstat(self._file.fileno()).st_ino
+            self._terminate_torn_tail()
+
+    def _terminate_torn_tail(self):
+        # A crash can leave a partial last line; close it off so it can't swallow the next record
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+        self._file.write("\n")
+        self._file.flush()
+
+    def append(self, op, doc_id, doc=None):
+        record = {"op": op, "id": doc_id}
+        if doc is not None:
+            record["doc"] = doc
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Append records ({"op", "id", "doc"?, ...}) with one write and at most one fsync"""
+        with self.write_lock, self._lock:
+            self._ensure_open()
+            self._catch_up()
+            lines = []
+            for record in records:
+                self.seq += 1
+                lines.append(json.dumps({"seq": self.seq, **record}) + "\n")
+            self._file.write("".join(lines))
+            self._file.flush()
+
+            self._dirty = True
+            if self.fsync_policy == 'always':
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def _maintenance(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._dirty and self.fsync_policy == 'interval' and self._file is not None:
+                    self._fsync()
+            if self._should_compact():
+                self.compact()
+
+    def _should_compact(self):
+        if time.monotonic() - self._last_compact < self.compact_interval:
+            return False
+        with self._lock:
+            live = len(self._live_ids)
+            garbage = self._records - live
+        return garbage >= self.compact_min_records and garbage > live
+
+    def compact(self):
+        """Rewrite the log to hold only one record per live document"""
+        with self.write_lock, self._lock:
+            # Replay from disk rather than memory so other workers' writes are kept
+            docs = {}
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.seq = max(self.seq, record.get("seq", 0))
+                    apply_record(docs, record)
+            self._write_compacted(list(docs.values()))
+            self._last_compact = time.monotonic()
+            # The next poll reports a replaced log so readers reload the compacted view
+            self._ino = None
+
+    def _write_compacted(self, docs):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # The checkpoint keeps seq monotonic across compactions
+            f.write(json.dumps({"seq": self.seq, "op": "checkpoint"}) + "\n")
+            for doc in docs:
+                f.write(json.dumps({"seq": self.seq, "op": "add", "id": doc["id"], "doc": doc}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._records = len(docs) + 1
+        self._live_ids = {doc["id"] for doc in docs}
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class EventBroadcaster:
+    """Fans event deltas out to server-sent-event clients in this worker.
+
+    Deltas come from the event log records RAGBackend.refresh() applies, so writes
+    from every worker are streamed, each with its log seq as the SSE id. Every delta
+    is serialized once into a bounded replay buffer; clients wait on one shared
+    Condition and copy frames from the buffer, so there is no per-client producer.
+    """
+
+    def __init__(self, buffer_size=1000, poll_interval=0.5, heartbeat=15.0):
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self._buffer = deque(maxlen=buffer_size)  # (seq, frame)
+        self._cond = threading.Condition()
+        self._head = 0
+        # Clients whose last id is below this missed deltas that are no longer buffered
+        self._floor = 0
+        self._generation = 0
+        self._source = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.clients = 0
+
+    def attach(self, rag):
+        """Receive every record rag.refresh() applies"""
+        self._source = rag
+        self._head = self._floor = rag.version
+        rag.listeners.append(self.publish)
+
+    def start(self):
+        """Start the polling thread once per process; safe to call on every request"""
+        if self._pid == os.getpid() or self._source is None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._poll, name="event-stream", daemon=True).start()
+
+    def _poll(self):
+        # Other workers' writes only reach us through refresh(), so keep calling it
+        while True:
+            try:
+                self._source.refresh()
+            except Exception as e:
+                print(f"Error refreshing events for stream: {e}")
+            time.sleep(self.poll_interval)
+
+    def publish(self, records, version):
+        """Called by RAGBackend.refresh(); records is None when the store was reloaded"""
+        with self._cond:
+            if records is None:
+                # Compacted or replaced: deltas can't be derived, clients must refetch
+                self._buffer.clear()
+                self._generation += 1
+                self._floor = version
+            else:
+                for record in records:
+                    action = {"add": "added", "update": "updated"}.get(record.get("op"))
+                    if action and "seq" in record:
+                        data = json.dumps({"action": action, "event": record["doc"]})
+                        if len(self._buffer) == self._buffer.maxlen:
+                            self._floor = self._buffer[0][0]
+                        self._buffer.append((record["seq"], f"id: {record['seq']}\nevent: {action}\ndata: {data}\n\n"))
+            self._head = max(self._head, version)
+            self._cond.notify_all()
+
+    def _frames_after(self, cursor):
+        frames = []
+        for seq, frame in reversed(self._buffer):
+            if seq <= cursor:
+                break
+            frames.append(frame)
+        frames.reverse()
+        return frames
+
+    def _reset_frame(self):
+        return f"id: {self._head}\nevent: reset\ndata: {{}}\n\n"
+
+    def subscribe(self, last_event_id=None, timeout=0):
+        """Generator of SSE frames, resuming after last_event_id when it is still buffered"""
+        with self._cond:
+            self.clients += 1
+            generation = self._generation
+            if last_event_id is None or last_event_id > self._head:
+                cursor = self._head
+                first = f"retry: 2000\nid: {cursor}\nevent: ready\ndata: {{}}\n\n"
+            elif last_event_id >= self._floor:
+                cursor = last_event_id
+                first = "retry: 2000\n\n" + "".join(self._frames_after(cursor))
+            else:
+                # Fell out of the replay buffer
+                cursor = self._head
+                first = "retry: 2000\n\n" + self._reset_frame()
+
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            yield first
+            while deadline is None or time.monotonic() < deadline:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._head > cursor or self._generation != generation,
+                        timeout=self.heartbeat,
+                    )
+                    if self._generation != generation:
+                        generation = self._generation
+                        cursor = self._head
+                        frames = [self._reset_frame()]
+                    else:
+                        frames = self._frames_after(cursor)
+                        cursor = self._head
+                # A comment line keeps proxies from closing an idle stream
+                yield "".join(frames) if frames else ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'clients': self.clients,
+                'buffered': len(self._buffer),
+                'head': self._head,
+                'replay_from': self._floor,
+            }
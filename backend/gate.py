@@ -0,0 +1,170 @@
+"""Cheap first-stage gate in front of the BERT binary classifier.
+
+A hashed-feature logistic regression, distilled from the binary model's own labels,
+drops tweets it is confident are non-informative; everything else still goes to BERT.
+
+Usage:
+    python gate.py train tweets.jsonl            # label with BERT, fit, report on a holdout
+    python gate.py evaluate tweets.jsonl         # precision/recall vs BERT per threshold
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import threading
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from config import Config
+from llm_client import normalize_tweet
+
+# BINARY_LABELS index of "non-informative"; the gate only ever predicts this class
+NON_INFORMATIVE = 1
+
+# Global gate instance shared by every request in the process
+_gate_instance = None
+_gate_lock = threading.Lock()
+
+
+def get_gate():
+    """Get the process-wide gate, or None when disabled or not trained yet"""
+    global _gate_instance
+    if not Config.GATE_ENABLED:
+        return None
+    if _gate_instance is None:
+        with _gate_lock:
+            if _gate_instance is None:
+                if not os.path.exists(Config.GATE_MODEL_PATH):
+                    print(f"Gate model not found at {Config.GATE_MODEL_PATH}, gating disabled")
+                    _gate_instance = False
+                else:
+                    _gate_instance = TweetGate.load(Config.GATE_MODEL_PATH, threshold=Config.GATE_THRESHOLD)
+    return _gate_instance or None
+
+
+class TweetGate:
+    def __init__(self, threshold=0.9, n_features=2 ** 18):
+        self.threshold = threshold
+        # Stateless hashing keeps the model small and needs no vocabulary fitting
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            preprocessor=normalize_tweet,
+        )
+        self.classifier = SGDClassifier(loss="log_loss", alpha=1e-5, class_weight="balanced", random_state=0)
+        self.skipped = 0
+        self.passed = 0
+
+    @classmethod
+    def load(cls, path, threshold=None):
+        with open(path, "rb") as f:
+            gate = pickle.load(f)
+        if threshold is not None:
+            gate.threshold = threshold
+        return gate
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["skipped"] = state["passed"] = 0
+        return state
+
+    def fit(self, tweets, labels):
+        """Fit on BERT's binary predictions (BINARY_LABELS indexes)"""
+        self.classifier.fit(self.vectorizer.transform(tweets), labels)
+        return self
+
+    def non_informative_proba(self, tweets):
+        column = list(self.classifier.classes_).index(NON_INFORMATIVE)
+        return self.classifier.predict_proba(self.vectorizer.transform(tweets))[:, column]
+
+    def screen(self, tweets, threshold=None):
+        """True for each tweet confidently non-informative enough to skip BERT"""
+        if not tweets:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        skip = [p >= threshold for p in self.non_informative_proba(tweets)]
+        skipped = sum(skip)
+        self.skipped += skipped
+        self.passed += len(skip) - skipped
+        return skip
+
+    def stats(self):
+        total = self.skipped + self.passed
+        return {
+            "threshold": self.threshold,
+            "skipped": self.skipped,
+            "passed": self.passed,
+            "skip_rate": round(self.skipped / total, 4) if total else 0,
+        }
+
+
+def evaluate(gate, tweets, labels, thresholds):
+    """Compare gate decisions with BERT labels at each threshold.
+
+    precision: share of skipped tweets BERT also calls non-informative.
+    recall: share of BERT-informative tweets the gate still lets through.
+    """
+    probs = gate.non_informative_proba(tweets)
+    informative = sum(1 for label in labels if label != NON_INFORMATIVE)
+    report = []
+    for threshold in thresholds:
+        skipped = [label for p, label in zip(probs, labels) if p >= threshold]
+        correct = sum(1 for label in skipped if label == NON_INFORMATIVE)
+        lost = len(skipped) - correct
+        report.append({
+            "threshold": threshold,
+            "skip_rate": round(len(skipped) / len(tweets), 4) if tweets else 0,
+            "precision": round(correct / len(skipped), 4) if skipped else 1.0,
+            "informative_recall": round(1 - lost / informative, 4) if informative else 1.0,
+            "informative_lost": lost,
+        })
+    return report
+
+
+def teacher_labels(tweets, batch_size=None):
+    """BINARY_LABELS indexes from the full BERT model"""
+    from model_manager import get_model_manager
+    return get_model_manager().predict_batch("binary", tweets, batch_size=batch_size or Config.CLASSIFIER_BATCH_SIZE)
+
+
+def main():
+    from ingest import read_tweets
+
+    parser = argparse.ArgumentParser(description="Train or evaluate the early-exit gate against the binary model")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("input", help="Tweet dump (.jsonl, .csv or one tweet per line)")
+    parser.add_argument("--model", default=Config.GATE_MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of tweets kept back for the train report")
+    parser.add_argument("--thresholds", default="0.5,0.7,0.8,0.9,0.95,0.99")
+    args = parser.parse_args()
+
+    tweets = [tweet for _, tweet in read_tweets(args.input) if isinstance(tweet, str) and tweet.strip()]
+    labels = teacher_labels(tweets)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    if args.command == "train":
+        pairs = list(zip(tweets, labels))
+        random.Random(0).shuffle(pairs)
+        split = int(len(pairs) * (1 - args.holdout))
+        train, test = pairs[:split], pairs[split:] or pairs[:split]
+        gate = TweetGate(threshold=Config.GATE_THRESHOLD).fit(*zip(*train))
+        gate.save(args.model)
+        print(f"Gate trained on {len(train)} tweets, saved to {args.model}")
+        tweets, labels = [t for t, _ in test], [l for _, l in test]
+    else:
+        gate = TweetGate.load(args.model)
+
+    print(json.dumps(evaluate(gate, tweets, labels, thresholds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
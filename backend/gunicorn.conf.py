@@ -1,6 +1,12 @@
-import multiprocessing
 import os
 
+# gevent has to patch the stdlib before ssl, torch or the app (preload_app) are imported
+if os.environ.get('GUNICORN_WORKER_CLASS', 'sync') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
+
 # Gunicorn configuration
 bind = "0.0.0.0:5002"
 workers = 1  # Reduce from default to avoid rate limiting
@@ -18,7 +24,9 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# 'gevent' (opt-in) lets each worker hold many /api/events/stream connections
+# (worker_connections); see the README before enabling it
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -27,6 +35,37 @@ keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
 
+# Each worker gets cpu_count // workers torch threads unless TORCH_THREADS_PER_WORKER is set.
+# Set PRELOAD_MODELS=True to load models in the master (preload_app) and share them across workers.
+def post_fork(server, worker):
+    from model_manager import configure_worker_threads
+    threads = configure_worker_threads(server.cfg.workers)
+    server.log.info(f"Worker {worker.pid} using {threads} torch threads")
+
+# Metrics: workers write to METRICS_MULTIPROC_DIR, the master serves the total on METRICS_PORT.
+# This file is read before preload_app loads the app, so the directory is set up (and the
+# old run's samples cleared) before prometheus_client is first imported.
+import shutil
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import Config
+if Config.ENABLE_MONITORING:
+    shutil.rmtree(Config.METRICS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(Config.METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = Config.METRICS_MULTIPROC_DIR
+import metrics
+
+def when_ready(server):
+    metrics.start_metrics_server()
+    if server.cfg.worker_class_str == "sync":
+        server.log.info(
+            f"Sync workers serve one request at a time: each /api/events/stream or job stream "
+            f"client holds a worker for up to {os.environ.get('EVENT_STREAM_TIMEOUT', 25)}s"
+        )
+
+def child_exit(server, worker):
+    metrics.mark_process_dead(worker.pid)
+
 # Logging
 accesslog = '-'
 errorlog = '-'
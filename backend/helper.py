@@ -1,93 +1,100 @@
 import os
 import json
-import torch
-from transformers import BertForSequenceClassification, BertTokenizer
 import numpy as np
-from openai import OpenAI
 from rag_backend import *
+from model_manager import get_model_manager
+from config import Config
+from llm_client import get_extractor
+from dedup import get_duplicate_index
+from inference_server import get_inference_client
+from gate import get_gate
+import metrics
 
 
 
-def binary_classifier(tweet, model_path="./models/binary_model"):
-    tokenizer = BertTokenizer.from_pretrained(model_path)
-    model = BertForSequenceClassification.from_pretrained(model_path)
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-    model.eval()
+BINARY_LABELS = {1: "non-informative", 0: "informative"}
+HUMANITARIAN_LABELS = {0:'affected_individuals', 1: 'infrastructure_and_utility_damage', 2: 'injured_or_dead_people', 3:'missing_or_found_people', 4: 'not_humanitarian', 5:'other_relevant_information',6:'rescue_volunteering_or_donation_effort', 7:'vehicle_damage'}
 
-    #tokenize input
-    inputs = tokenizer(tweet, return_tensors="pt", padding=True, truncation=True, max_length=128)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
 
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-        pred = torch.argmax(logits, dim=1).item()
+def binary_classifier(tweet):
+    # Models are loaded once per process and kept warm by the manager
+    pred = get_model_manager().predict('binary', [tweet])[0]
+    return BINARY_LABELS[pred]
 
-    label_map = {1: "non-informative", 0: "informative"}
-    return label_map[pred]
 
-
-def humanitarianClassifier(tweet, model_path="./models/multi-class-humanitarian_model"):
-    tokenizer = BertTokenizer.from_pretrained(model_path)
-    model = BertForSequenceClassification.from_pretrained(model_path)
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-    model.eval()
-    #tokenize input
-    inputs = tokenizer(tweet, return_tensors="pt", padding=True, truncation=True, max_length=128)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-        pred = torch.argmax(logits, dim=1).item()
-    
-    label_map = {0:'affected_individuals', 1: 'infrastructure_and_utility_damage', 2: 'injured_or_dead_people', 3:'missing_or_found_people', 4: 'not_humanitarian', 5:'other_relevant_information',6:'rescue_volunteering_or_donation_effort', 7:'vehicle_damage'}
-    return label_map[pred]
+def humanitarianClassifier(tweet):
+    pred = get_model_manager().predict('multi_class', [tweet])[0]
+    return HUMANITARIAN_LABELS[pred]
 
 def categorize_tweet(tweet):
+    if get_inference_client():
+        return categorize_tweets([tweet])[0]
+    gate = get_gate()
+    if gate and gate.screen([tweet])[0]:
+        return "This tweet doesn't contain any disaster related information."
     info_category = binary_classifier(tweet)
     if info_category=="non-informative":
         return "This tweet doesn't contain any disaster related information."
     humanitarian_category = humanitarianClassifier(tweet)
     return info_category, humanitarian_category
 
+def categorize_tweets(tweets, batch_size=None):
+    """Batched categorize_tweet: one binary pass over all tweets, one humanitarian pass over the informative ones"""
+    client = get_inference_client()
+    if client:
+        return client.classify(tweets) if tweets else []
+    return categorize_tweets_local(tweets, batch_size=batch_size)
+
+def categorize_tweets_local(tweets, batch_size=None):
+    if not tweets:
+        return []
+    manager = get_model_manager()
+    batch_size = batch_size or Config.CLASSIFIER_BATCH_SIZE
+
+    # Only tweets the gate isn't sure about pay for the BERT binary pass
+    gate = get_gate()
+    candidates = [i for i, skip in enumerate(gate.screen(tweets)) if not skip] if gate else list(range(len(tweets)))
+    info_categories = {}
+    if candidates:
+        preds = manager.predict_batch('binary', [tweets[i] for i in candidates], batch_size=batch_size)
+        info_categories = {i: BINARY_LABELS[p] for i, p in zip(candidates, preds)}
+    informative = [i for i in candidates if info_categories[i] == "informative"]
+
+    results = ["This tweet doesn't contain any disaster related information."] * len(tweets)
+    if informative:
+        preds = manager.predict_batch('multi_class', [tweets[i] for i in informative], batch_size=batch_size)
+        for i, pred in zip(informative, preds):
+            results[i] = (info_categories[i], HUMANITARIAN_LABELS[pred])
+    return results
+
 def call_gpt_extractor(tweet, existing_summary=None):
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    prompt = f"""
-    You are an expert in extracting structured information from tweets about disasters.
-    Given the tweet and existing event summary, return a JSON with important details about the event.
-    The JSON may include the following fields:
-    - event_type
-    - locations (seperated by comma)
-    - people_killed (just number)
-    - people_trapped (just number)
-    - infrastructure_damage
-    - any other details you find relevant
-    - summary (updated, more detailed)
-    - category (category mentioned at last of tweet)
-
-    Tweet: "{tweet}"
-    Existing Event Summary: "{existing_summary or 'None'}"
-
-    Respond only in JSON format.
-    """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2
-    )
-    return response.choices[0].message.content
-
-def DisasterExtraction(tweet):
-    rag = RAGBackend()
-    info_category = binary_classifier(tweet)
-    if info_category=="non-informative":
-        return "This tweet doesn't contain any disaster related information."
-    humanitarian_category = humanitarianClassifier(tweet)
+    # Shared pooled client with retries; duplicate tweets are answered from cache
+    return get_extractor().extract(tweet, existing_summary)
+
+def extract_event(tweet, humanitarian_category, rag):
     tweet+= f", Category: {humanitarian_category}"
     gpt_response = call_gpt_extractor(tweet)
-    result = rag.process_event(gpt_response)
+    return rag.process_event(gpt_response)
+
+def process_tweet(tweet, rag, categorize=categorize_tweet):
+    """Classify, extract and store one tweet, short-circuiting near-duplicates of recent tweets"""
+    index = get_duplicate_index()
+    seen = index.lookup(tweet) if index else None
+    if isinstance(seen, str):
+        # A copy of a tweet already judged non-informative
+        return seen
+    if seen is not None and rag.get_document(seen["id"]) is not None:
+        metrics.count_event("deduped")
+        return {"action": "duplicate", "id": seen["id"]}
+
+    categories = categorize(tweet)
+    if isinstance(categories, str):
+        result = categories
+    else:
+        result = extract_event(tweet, categories[1], rag)
+    if index:
+        index.add(tweet, result)
     return result
 
+def DisasterExtraction(tweet, rag=None):
+    return process_tweet(tweet, rag or RAGBackend())
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Metadata flag of events stored without a known location; they match any location
+ANY_LOCATION = "loc_any"
+
+
+class HotEventIndex:
+    """Bounded in-memory LRU of recently written event embeddings.
+
+    Checked before Chroma when matching a new event: active incidents get most of the
+    updates, so the nearest neighbour is usually here and the store is never queried.
+    Distances are squared L2, the same metric Chroma's default collection uses, so one
+    similarity threshold applies to both.
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self._matrix = None
+        self._slots = OrderedDict()  # id -> row in _matrix, least recently used first
+        self._meta = {}  # id -> event metadata (see event_metadata)
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slots
+
+    def put(self, doc_id, embedding, metadata):
+        if not self.max_entries:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._slots.get(doc_id)
+            if slot is None:
+                if not self._free:
+                    evicted, slot = self._slots.popitem(last=False)
+                    del self._meta[evicted]
+                else:
+                    slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._slots[doc_id] = slot
+            self._slots.move_to_end(doc_id)
+            self._meta[doc_id] = metadata
+
+    def ids(self):
+        with self._lock:
+            return list(self._slots)
+
+    def discard(self, doc_id):
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is not None:
+                del self._meta[doc_id]
+                self._free.append(slot)
+
+    def nearest(self, embedding, criteria):
+        """(id, squared L2 distance) of the closest entry passing criteria, or None"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            ids = [doc_id for doc_id in self._slots if matches(self._meta[doc_id], criteria)]
+            if not ids:
+                self.misses += 1
+                return None
+            rows = self._matrix[[self._slots[doc_id] for doc_id in ids]]
+            distances = ((rows - vector) ** 2).sum(axis=1)
+            best = int(distances.argmin())
+            self.hits += 1
+            return ids[best], float(distances[best])
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._slots), 'hits': self.hits, 'misses': self.misses}
+
+
+def matches(metadata, criteria):
+    """In-memory equivalent of the Chroma where clause built from the same criteria"""
+    if criteria.get("event_type") and metadata.get("event_type") != criteria["event_type"]:
+        return False
+    if criteria.get("since") and metadata.get("updated_at", 0) < criteria["since"]:
+        return False
+    locations = criteria.get("locations")
+    if locations and not metadata.get(ANY_LOCATION) and not any(metadata.get(key) for key in locations):
+        return False
+    return True
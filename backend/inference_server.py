@@ -0,0 +1,156 @@
+"""Standalone inference service shared by all gunicorn workers.
+
+Hosts the BERT classifiers (ModelManager) and the sentence-transformer embedder in
+one process and micro-batches requests from every worker together. Workers talk to
+it through InferenceClient when INFERENCE_SERVER_ADDRESS is set.
+
+Usage:
+    INFERENCE_SERVER_ADDRESS=unix:/tmp/crisisinfo-inference.sock \\
+    INFERENCE_SERVER_AUTHKEY=change-me python inference_server.py
+"""
+import argparse
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+from batcher import MicroBatcher
+from config import Config
+
+# Global client instance shared by every request in the process
+_client_instance = None
+_client_lock = threading.Lock()
+
+
+def parse_address(address):
+    """'unix:/path/to.sock' -> socket path, 'host:port' -> (host, port)"""
+    if address.startswith("unix:"):
+        return address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def _authkey():
+    if not Config.INFERENCE_SERVER_AUTHKEY:
+        raise RuntimeError("INFERENCE_SERVER_AUTHKEY must be set when INFERENCE_SERVER_ADDRESS is used")
+    return Config.INFERENCE_SERVER_AUTHKEY.encode()
+
+
+def get_inference_client():
+    """Get the process-wide client, or None when inference runs in-process"""
+    global _client_instance
+    if not Config.INFERENCE_SERVER_ADDRESS:
+        return None
+    if _client_instance is None:
+        with _client_lock:
+            if _client_instance is None:
+                _client_instance = InferenceClient(Config.INFERENCE_SERVER_ADDRESS, _authkey())
+    return _client_instance
+
+
+class InferenceClient:
+    """Thin worker-side client; one connection per thread, reconnecting after a server restart"""
+
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, op, texts):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send({"op": op, "texts": list(texts)})
+                reply = conn.recv()
+                break
+            except (EOFError, ConnectionError, OSError):
+                self._local.conn = None
+                if attempt:
+                    raise
+        if not reply.get("ok"):
+            raise RuntimeError(f"Inference server error: {reply.get('error')}")
+        return reply["results"]
+
+    def classify(self, texts):
+        """categorize_tweets results for texts"""
+        return self._call("classify", texts)
+
+    def embed(self, texts):
+        """Embedding vectors (lists of floats) for texts"""
+        return self._call("embed", texts)
+
+
+class InferenceServer:
+    def __init__(self, address, authkey, max_batch_size=None, max_wait_ms=None):
+        from helper import categorize_tweets_local
+        from rag_backend import get_model
+        from model_manager import get_model_manager
+
+        # Warm everything before accepting connections
+        get_model_manager()
+        embedder = get_model()
+
+        max_batch_size = max_batch_size or Config.INFERENCE_SERVER_BATCH_SIZE
+        max_wait_ms = max_wait_ms or Config.MICRO_BATCH_MAX_WAIT_MS
+        self.batchers = {
+            "classify": MicroBatcher(categorize_tweets_local, max_batch_size, max_wait_ms, name="server-classify"),
+            "embed": MicroBatcher(lambda texts: embedder.encode(texts).tolist(), max_batch_size, max_wait_ms, name="server-embed"),
+        }
+        self.address = parse_address(address)
+        self.authkey = authkey
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # Failed handshakes (wrong authkey) shouldn't stop the server
+                    print(f"Rejected inference connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    return
+                batcher = self.batchers.get(request.get("op"))
+                if batcher is None:
+                    conn.send({"ok": False, "error": f"Unknown op {request.get('op')!r}"})
+                    continue
+                try:
+                    # Each text joins the shared micro-batch with other workers' requests
+                    futures = [batcher.submit(text) for text in request["texts"]]
+                    conn.send({"ok": True, "results": [future.result() for future in futures]})
+                except Exception as e:
+                    conn.send({"ok": False, "error": str(e)})
+
+    def stats(self):
+        return {op: batcher.stats() for op, batcher in self.batchers.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the shared classifier/embedding inference server")
+    parser.add_argument("--address", default=Config.INFERENCE_SERVER_ADDRESS or "unix:/tmp/crisisinfo-inference.sock")
+    parser.add_argument("--batch-size", type=int, default=Config.INFERENCE_SERVER_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=Config.MICRO_BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    address = parse_address(args.address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    InferenceServer(args.address, _authkey(), args.batch_size, args.max_wait_ms).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
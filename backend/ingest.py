@@ -0,0 +1,344 @@
+"""Streaming bulk ingest of tweet dumps.
+
+Tweets flow through bounded queues between stages, each with its own worker pool:
+
+    classify (binary -> humanitarian, batched) -> extract (LLM) -> store (RAG dedup, batched)
+
+Usage:
+    python ingest.py tweets.jsonl --output results.jsonl
+    python ingest.py tweets.csv --resume
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from config import Config
+from dedup import NearDuplicateIndex, get_duplicate_index
+from helper import categorize_tweets, call_gpt_extractor
+import metrics
+
+_DONE = object()
+
+
+class BadRecord(ValueError):
+    """Yielded by read_tweets() in place of a tweet for an input line that can't be read"""
+
+
+def read_tweets(path, skip=0):
+    """Yield (index, tweet) from a .jsonl, .csv or plain-text file, skipping the first `skip`.
+
+    A malformed line yields (index, BadRecord) instead of stopping the read.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            rows = (row.get("tweet") or row.get("text") or "" for row in csv.DictReader(f))
+        elif ext in (".jsonl", ".ndjson"):
+            rows = (_jsonl_tweet(line, number) for number, line in enumerate(f, 1))
+        else:
+            rows = (line.rstrip("\n") for line in f)
+
+        for index, tweet in enumerate(rows):
+            if index < skip:
+                continue
+            yield index, tweet
+
+
+def _jsonl_tweet(line, number):
+    line = line.strip()
+    if not line:
+        return ""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return BadRecord(f"Line {number} is not valid JSON: {e}")
+    if isinstance(record, str):
+        return record
+    tweet = record.get("tweet") or record.get("text") if isinstance(record, dict) else None
+    if not isinstance(tweet, str):
+        return BadRecord(f"Line {number} has no tweet or text field")
+    return tweet
+
+
+def read_results(path):
+    """{index: result} from a results file written by checkpointed(), later lines winning"""
+    results = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    results[record["index"]] = record["result"]
+    return results
+
+
+class Checkpoint:
+    """Tracks finished input indexes and persists the contiguous watermark for --resume"""
+
+    def __init__(self, path):
+        self.path = path
+        self.watermark = 0
+        self._done = set()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.watermark = json.load(f).get("watermark", 0)
+
+    def mark(self, index):
+        self._done.add(index)
+        while self.watermark in self._done:
+            self._done.discard(self.watermark)
+            self.watermark += 1
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"watermark": self.watermark}, f)
+        os.replace(tmp_path, self.path)
+
+
+class _Stage:
+    """A worker pool draining one bounded queue into the next.
+
+    fn receives a list of up to batch_size items and returns them; items that carry a
+    "result" are finished and go to the results queue, the rest go to outbox. Items
+    collected under a finished item's "duplicates" are finished with it.
+    """
+
+    def __init__(self, name, fn, workers, inbox, outbox, results, batch_size=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.results = results
+        self.batch_size = batch_size
+        self._remaining = workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"ingest-{self.name}-{i}", daemon=True).start()
+
+    def _take(self):
+        metrics.set_queue_depth(f"ingest_{self.name}", self.inbox.qsize())
+        first = self.inbox.get()
+        if first is _DONE:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self.inbox.put(_DONE)
+                break
+            batch.append(item)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                break
+            try:
+                batch = self.fn(batch)
+            except Exception as e:
+                logging.exception(f"Ingest stage {self.name} failed on a batch: {e}")
+                # Duplicates already attached to an item are finished with it, not twice
+                attached = {id(duplicate) for item in batch for duplicate in item.get("duplicates", ())}
+                batch = [item for item in batch if id(item) not in attached]
+                for item in batch:
+                    item["result"] = {"error": str(e)}
+            for item in batch:
+                if "result" in item:
+                    self._finish(item)
+                else:
+                    self.outbox.put(item)
+
+        # Let sibling workers see the end, and close the next stage after the last one exits
+        self.inbox.put(_DONE)
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self.outbox.put(_DONE)
+
+    def _finish(self, item):
+        self.results.put(item)
+        result = item["result"]
+        for duplicate in item.pop("duplicates", ()):
+            if isinstance(result, dict) and "id" in result:
+                duplicate["result"] = {"action": "duplicate", "id": result["id"]}
+                metrics.count_event("deduped")
+            else:
+                duplicate["result"] = result
+            self.results.put(duplicate)
+
+
+class IngestPipeline:
+    def __init__(self, rag, batch_size=None, extract_workers=None, queue_size=None):
+        self.rag = rag
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self.extract_workers = extract_workers or Config.LLM_MAX_CONCURRENCY
+        self.queue_size = queue_size or Config.INGEST_QUEUE_SIZE
+        self.processed = 0
+        self.started = None
+
+    def _classify(self, batch):
+        index = get_duplicate_index()
+        # Repeats within the batch ride along with their first occurrence instead of
+        # each paying for the classifiers and the LLM
+        batch_index = NearDuplicateIndex(len(batch), index.max_distance) if index else None
+        kept, pending = [], []
+        for item in batch:
+            seen = index.lookup(item["tweet"]) if index else None
+            if isinstance(seen, str):
+                item["result"] = seen
+            elif seen is not None:
+                item["result"] = {"action": "duplicate", "id": seen["id"]}
+                metrics.count_event("deduped")
+            elif not item["tweet"].strip():
+                item["result"] = {"error": "Empty tweet"}
+            else:
+                first = batch_index.lookup(item["tweet"]) if batch_index else None
+                if first is not None:
+                    first.setdefault("duplicates", []).append(item)
+                    continue
+                if batch_index:
+                    batch_index.add(item["tweet"], item)
+                pending.append(item)
+            kept.append(item)
+
+        for item, categories in zip(pending, categorize_tweets([item["tweet"] for item in pending])):
+            if isinstance(categories, str):
+                item["result"] = categories
+                if index:
+                    index.add(item["tweet"], categories)
+            else:
+                item["category"] = categories[1]
+        return kept
+
+    def _extract(self, batch):
+        for item in batch:
+            item["event"] = call_gpt_extractor(f"{item['tweet']}, Category: {item['category']}")
+        return batch
+
+    def _store(self, batch):
+        index = get_duplicate_index()
+        for item, result in zip(batch, self.rag.process_events([item["event"] for item in batch])):
+            item["result"] = result
+            if index and "error" not in result:
+                index.add(item["tweet"], result)
+        return batch
+
+    def run(self, tweets):
+        """Stream (index, tweet) pairs through the stages, yielding (index, tweet, result) as they finish"""
+        classify_q = queue.Queue(maxsize=self.queue_size)
+        extract_q = queue.Queue(maxsize=self.queue_size)
+        store_q = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue()
+        # The store stage has no next stage; its end marker lands in results
+        stages = [
+            _Stage("classify", self._classify, 1, classify_q, extract_q, results, batch_size=self.batch_size),
+            _Stage("extract", self._extract, self.extract_workers, extract_q, store_q, results),
+            _Stage("store", self._store, 1, store_q, results, results, batch_size=self.batch_size),
+        ]
+        for stage in stages:
+            stage.start()
+
+        def feed():
+            try:
+                for index, tweet in tweets:
+                    if isinstance(tweet, BadRecord):
+                        results.put({"index": index, "tweet": "", "result": {"error": str(tweet)}})
+                    else:
+                        classify_q.put({"index": index, "tweet": tweet})
+            except Exception as e:
+                logging.exception(f"Ingest input failed: {e}")
+            finally:
+                # Always close the stages, or run() would wait for results forever
+                classify_q.put(_DONE)
+
+        threading.Thread(target=feed, name="ingest-feed", daemon=True).start()
+
+        self.started = time.monotonic()
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            self.processed += 1
+            yield item["index"], item["tweet"], item["result"]
+
+    def throughput(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            "processed": self.processed,
+            "elapsed_seconds": round(elapsed, 3),
+            "tweets_per_second": round(self.processed / elapsed, 2) if elapsed else 0,
+        }
+
+
+def checkpointed(results, output, checkpoint, flush_every=100):
+    """Pass (index, tweet, result) through, appending to the open output file and saving
+    the checkpoint every flush_every results and at the end"""
+    pending = []
+
+    def flush():
+        output.write("".join(pending))
+        output.flush()
+        pending.clear()
+        checkpoint.save()
+
+    for index, tweet, result in results:
+        pending.append(json.dumps({"index": index, "tweet": tweet, "result": result}) + "\n")
+        checkpoint.mark(index)
+        if len(pending) >= flush_every:
+            flush()
+        yield index, tweet, result
+    flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a tweet dump (.jsonl, .csv or one tweet per line)")
+    parser.add_argument("input")
+    parser.add_argument("--output", help="JSONL file for per-tweet results (default: <input>.results.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="Continue after the last checkpointed tweet")
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument("--extract-workers", type=int, default=Config.LLM_MAX_CONCURRENCY)
+    parser.add_argument("--flush-every", type=int, default=100, help="Write results and checkpoint every N tweets")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between throughput reports")
+    args = parser.parse_args()
+
+    from rag_backend import RAGBackend
+
+    output_path = args.output or args.input + ".results.jsonl"
+    checkpoint = Checkpoint(args.input + ".checkpoint.json")
+    if not args.resume:
+        checkpoint.watermark = 0
+    elif checkpoint.watermark:
+        print(f"Resuming after tweet {checkpoint.watermark}")
+
+    pipeline = IngestPipeline(RAGBackend(), batch_size=args.batch_size, extract_workers=args.extract_workers)
+    last_report = time.monotonic()
+    with open(output_path, "a" if args.resume else "w", encoding="utf-8") as out:
+        results = pipeline.run(read_tweets(args.input, skip=checkpoint.watermark))
+        for _ in checkpointed(results, out, checkpoint, flush_every=args.flush_every):
+            if time.monotonic() - last_report >= args.report_every:
+                stats = pipeline.throughput()
+                print(f"{stats['processed']} tweets, {stats['tweets_per_second']} tweets/s")
+                last_report = time.monotonic()
+
+    stats = pipeline.throughput()
+    print(f"Done: {stats['processed']} tweets in {stats['elapsed_seconds']}s ({stats['tweets_per_second']} tweets/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """SQLite-backed job queue shared by every worker process.
+
+    Jobs move queued -> running -> done/failed. A running job whose lease expires
+    (its worker died or was recycled) is handed out again.
+    """
+
+    def __init__(self, path, lease_seconds=120):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, payload):
+        job_id = str(uuid4())
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, status, payload, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, json.dumps(payload), now, now),
+        )
+        return job_id
+
+    def claim(self):
+        """Atomically take the oldest runnable job; returns (id, payload) or None"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + self.lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row["id"], json.loads(row["payload"])
+
+    def renew(self, job_ids):
+        """Extend the lease of running jobs that are still being worked on"""
+        if not job_ids:
+            return
+        now = time.time()
+        self._connection().execute(
+            f"UPDATE jobs SET lease_until = ?, updated_at = ? WHERE status = 'running' "
+            f"AND id IN ({','.join('?' * len(job_ids))})",
+            (now + self.lease_seconds, now, *job_ids),
+        )
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_until = NULL WHERE id = ?",
+            (status, result, error, time.time(), job_id),
+        )
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            "SELECT id, status, result, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def queued(self):
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def counts(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobWorkerPool:
+    """Threads in the current process that claim and run jobs from a JobQueue.
+
+    Leases of the jobs running here are renewed every third of the lease, so a long job
+    is only handed out again if this process dies.
+    """
+
+    def __init__(self, job_queue, handler, workers=2, poll_interval=0.5):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._running = set()
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the pool once per process; safe to call on every request"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._running = set()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+            threading.Thread(target=self._renew_leases, name="job-lease", daemon=True).start()
+
+    def notify(self):
+        """Wake idle workers in this process instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    def _work(self):
+        while True:
+            try:
+                job = self.job_queue.claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = job
+            metrics.set_jobs_queued(self.job_queue.queued())
+            self._running.add(job_id)
+            try:
+                self.job_queue.complete(job_id, self.handler(payload))
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.job_queue.fail(job_id, e)
+            finally:
+                self._running.discard(job_id)
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.job_queue.lease_seconds / 3)
+            try:
+                self.job_queue.renew(list(self._running))
+            except sqlite3.Error as e:
+                print(f"Error renewing job leases: {e}")
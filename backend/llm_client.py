@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from config import Config
+import metrics
+
+# Global extractor instance shared by every request in the process
+_extractor_instance = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """Get or create the process-wide LLM extractor"""
+    global _extractor_instance
+    if _extractor_instance is None:
+        with _extractor_lock:
+            if _extractor_instance is None:
+                _extractor_instance = LLMExtractor.from_config(Config)
+    return _extractor_instance
+
+
+def build_prompt(tweet, existing_summary=None):
+    return f"""
+    You are an expert in extracting structured information from tweets about disasters.
+    Given the tweet and existing event summary, return a JSON with important details about the event.
+    The JSON may include the following fields:
+    - event_type
+    - locations (seperated by comma)
+    - people_killed (just number)
+    - people_trapped (just number)
+    - infrastructure_damage
+    - any other details you find relevant
+    - summary (updated, more detailed)
+    - category (category mentioned at last of tweet)
+
+    Tweet: "{tweet}"
+    Existing Event Summary: "{existing_summary or 'None'}"
+
+    Respond only in JSON format.
+    """
+
+
+_RETWEET = re.compile(r"^rt\s+@\w+:?\s*")
+_URL = re.compile(r"https?://[^\s,]+")
+_MENTION = re.compile(r"@\w+")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([,.!?;:])")
+
+
+def normalize_tweet(text):
+    """Lowercase and strip retweet prefixes, links and mentions so copies hash alike"""
+    text = text.lower().strip()
+    text = _RETWEET.sub("", text)
+    text = _URL.sub("", text)
+    text = _MENTION.sub("", text)
+    return _SPACE_BEFORE_PUNCT.sub(r"\1", " ".join(text.split()))
+
+
+class OpenAIBackend:
+    """Chat-completions backend; clients are created once per process and reused"""
+
+    def __init__(self, api_key=None, model="gpt-4", timeout=30.0):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.model = model
+        self.timeout = timeout
+        self._client = None
+        self._pid = None
+        self._async_client = None
+        self._async_loop = None
+
+        import openai
+        self.retryable_errors = (
+            openai.APIConnectionError,
+            openai.APITimeoutError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        )
+
+    def _sync_client(self):
+        # The underlying HTTP connection pool must not be shared across a fork
+        if self._pid != os.getpid():
+            from openai import OpenAI
+            # Retries are handled by LLMExtractor so the backoff policy lives in one place
+            self._client = OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+            self._pid = os.getpid()
+        return self._client
+
+    def _loop_client(self):
+        # Async connection pools are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+            self._async_loop = loop
+        return self._async_client
+
+    def _request(self, tweet, existing_summary):
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": build_prompt(tweet, existing_summary)}],
+            temperature=0.2,
+        )
+
+    def complete(self, tweet, existing_summary=None):
+        client = self._sync_client()
+        response = client.chat.completions.create(**self._request(tweet, existing_summary))
+        return response.choices[0].message.content
+
+    async def acomplete(self, tweet, existing_summary=None):
+        client = self._loop_client()
+        response = await client.chat.completions.create(**self._request(tweet, existing_summary))
+        return response.choices[0].message.content
+
+
+class LocalBackend:
+    """Offline stand-in that fills the extraction JSON with simple rules.
+
+    Used for tests and benchmarks; it never touches the network.
+    """
+
+    retryable_errors = ()
+
+    EVENT_KEYWORDS = {
+        'earthquake': 'Earthquake', 'quake': 'Earthquake', 'flood': 'Flood', 'rain': 'Heavy Rainfall',
+        'hurricane': 'Hurricane', 'cyclone': 'Cyclone', 'typhoon': 'Typhoon', 'tornado': 'Tornado',
+        'wildfire': 'Wildfire', 'fire': 'Fire', 'tsunami': 'Tsunami', 'landslide': 'Landslide',
+        'explosion': 'Explosion', 'war': 'War', 'attack': 'Attack', 'storm': 'Storm',
+    }
+    _CATEGORY = re.compile(r",\s*Category:\s*(\w+)\s*$")
+    _LOCATION = re.compile(r"\b(?:in|at|near|across)\s+((?:[A-Z][\w'-]*)(?:\s+[A-Z][\w'-]*)*)")
+    _KILLED = re.compile(r"(\d+)\s+(?:people\s+)?(?:dead|killed|died|deaths)", re.IGNORECASE)
+    _TRAPPED = re.compile(r"(\d+)\s+(?:people\s+)?(?:trapped|missing|stranded)", re.IGNORECASE)
+
+    def __init__(self, latency=0.0):
+        # Optional artificial delay to mimic a remote round trip in benchmarks
+        self.latency = latency
+
+    def _extract(self, tweet, existing_summary):
+        category = self._CATEGORY.search(tweet)
+        text = self._CATEGORY.sub("", tweet).strip()
+        lowered = text.lower()
+        event_type = next((name for word, name in self.EVENT_KEYWORDS.items() if word in lowered), "Unknown")
+        killed = self._KILLED.search(text)
+        trapped = self._TRAPPED.search(text)
+        summary = text if not existing_summary else f"{existing_summary} {text}"
+        return json.dumps({
+            "event_type": event_type,
+            "locations": ", ".join(dict.fromkeys(self._LOCATION.findall(text))) or "Unknown",
+            "people_killed": int(killed.group(1)) if killed else "Unknown",
+            "people_trapped": int(trapped.group(1)) if trapped else "Unknown",
+            "infrastructure_damage": "Unknown",
+            "summary": summary,
+            "category": category.group(1) if category else "Unknown",
+        })
+
+    def complete(self, tweet, existing_summary=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._extract(tweet, existing_summary)
+
+    async def acomplete(self, tweet, existing_summary=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._extract(tweet, existing_summary)
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'local': LocalBackend,
+}
+
+
+class LLMExtractor:
+    """Bounded-concurrency, retrying and caching front end over an extraction backend"""
+
+    def __init__(self, backend, max_concurrency=8, max_retries=3, retry_backoff=0.5, cache_size=4096):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.cache_size = cache_size
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # asyncio semaphores are bound to one event loop, so each loop gets its own
+        self._loop_semaphores = weakref.WeakKeyDictionary()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.calls = 0
+
+    @classmethod
+    def from_config(cls, config):
+        if config.LLM_BACKEND == 'openai':
+            backend = OpenAIBackend(api_key=config.OPENAI_API_KEY, model=config.OPENAI_MODEL, timeout=config.LLM_TIMEOUT)
+        elif config.LLM_BACKEND in BACKENDS:
+            backend = BACKENDS[config.LLM_BACKEND]()
+        else:
+            raise ValueError(f"Unknown LLM backend '{config.LLM_BACKEND}', expected one of {list(BACKENDS)}")
+        return cls(
+            backend,
+            max_concurrency=config.LLM_MAX_CONCURRENCY,
+            max_retries=config.LLM_MAX_RETRIES,
+            retry_backoff=config.LLM_RETRY_BACKOFF,
+            cache_size=config.LLM_CACHE_SIZE,
+        )
+
+    def cache_key(self, tweet, existing_summary=None):
+        raw = normalize_tweet(tweet) + "\x00" + (existing_summary or "")
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cached(self, key):
+        with self._cache_lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return response
+
+    def _remember(self, key, response):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[key] = response
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _loop_semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._cache_lock:
+            semaphore = self._loop_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._loop_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return semaphore
+
+    def _backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt)
+
+    def extract(self, tweet, existing_summary=None):
+        """Extraction JSON string for a tweet, served from cache for duplicates"""
+        key = self.cache_key(tweet, existing_summary)
+        response = self._cached(key)
+        if response is not None:
+            return response
+
+        with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.calls += 1
+                    with metrics.observe("llm_call"):
+                        response = self.backend.complete(tweet, existing_summary)
+                    break
+                except self.backend.retryable_errors as e:
+                    if attempt == self.max_retries:
+                        raise
+                    print(f"LLM call failed ({e}), retrying")
+                    time.sleep(self._backoff(attempt))
+
+        self._remember(key, response)
+        return response
+
+    async def extract_async(self, tweet, existing_summary=None, semaphore=None):
+        key = self.cache_key(tweet, existing_summary)
+        response = self._cached(key)
+        if response is not None:
+            return response
+
+        async with semaphore or self._loop_semaphore():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.calls += 1
+                    with metrics.observe("llm_call"):
+                        response = await self.backend.acomplete(tweet, existing_summary)
+                    break
+                except self.backend.retryable_errors as e:
+                    if attempt == self.max_retries:
+                        raise
+                    print(f"LLM call failed ({e}), retrying")
+                    await asyncio.sleep(self._backoff(attempt))
+
+        self._remember(key, response)
+        return response
+
+    async def extract_many_async(self, tweets, existing_summaries=None):
+        """Run many extractions concurrently, at most max_concurrency in flight"""
+        existing_summaries = existing_summaries or [None] * len(tweets)
+        return await asyncio.gather(*[
+            self.extract_async(tweet, summary)
+            for tweet, summary in zip(tweets, existing_summaries)
+        ])
+
+    def extract_many(self, tweets, existing_summaries=None):
+        """Blocking wrapper around extract_many_async for sync callers"""
+        return asyncio.run(self.extract_many_async(tweets, existing_summaries))
+
+    def stats(self):
+        with self._cache_lock:
+            return {'calls': self.calls, 'cache_hits': self.cache_hits, 'cache_entries': len(self._cache)}
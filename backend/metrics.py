@@ -0,0 +1,141 @@
+"""Prometheus metrics shared by every gunicorn worker.
+
+Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at METRICS_MULTIPROC_DIR
+before this module is imported; workers write samples there (prometheus_client's
+multiprocess mode) and the master serves the aggregate on METRICS_PORT. Anywhere else
+(python app.py, the CLIs) metrics stay in process and nothing is written to disk.
+Everything here is a no-op when ENABLE_MONITORING is false or prometheus_client is
+not installed, so call sites never need to check.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+enabled = False
+multiproc = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+if Config.ENABLE_MONITORING:
+    try:
+        from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+        enabled = True
+    except ImportError:
+        print("prometheus_client is not installed, metrics disabled")
+
+# Stage latency buckets from sub-millisecond index lookups up to slow LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+if enabled:
+    STAGE_SECONDS = Histogram(
+        "crisisinfo_stage_seconds",
+        "Time spent in each pipeline stage",
+        ["stage"],
+        buckets=BUCKETS,
+    )
+    EVENTS = Counter("crisisinfo_events_total", "Tweets stored, by outcome", ["action"])
+    QUEUE_DEPTH = Gauge(
+        "crisisinfo_queue_depth",
+        "Items waiting in in-process queues, summed over live workers",
+        ["queue"],
+        multiprocess_mode="livesum",
+    )
+    JOBS_QUEUED = Gauge(
+        "crisisinfo_jobs_queued",
+        "Jobs waiting in the shared job queue",
+        multiprocess_mode="livemax",
+    )
+
+
+@contextmanager
+def observe(stage):
+    """Time the enclosed block into crisisinfo_stage_seconds{stage=...}"""
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def count_event(action):
+    """Count a stored tweet outcome: added, updated or deduped"""
+    if enabled:
+        EVENTS.labels(action).inc()
+
+
+def set_queue_depth(queue_name, depth):
+    if enabled:
+        QUEUE_DEPTH.labels(queue_name).set(depth)
+
+
+def set_jobs_queued(depth):
+    if enabled:
+        JOBS_QUEUED.set(depth)
+
+
+def start_metrics_server(port=None):
+    """Serve this process's metrics on port, or every worker's in multiprocess mode"""
+    if not enabled:
+        return False
+    registry = REGISTRY
+    if multiproc:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port or Config.METRICS_PORT, registry=registry)
+    print(f"Metrics available on port {port or Config.METRICS_PORT}")
+    return True
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges so they stop counting toward the totals"""
+    if enabled and multiproc:
+        multiprocess.mark_process_dead(pid)
+
+
+def install_request_profiler(app):
+    """Profile requests with cProfile when PROFILE_REQUESTS is on or the request sends X-Profile: 1.
+
+    Each profile is written to PROFILE_DIR as a .prof file (open with snakeviz or pstats)
+    and the top functions by cumulative time are printed.
+
+    cProfile only sees the request thread. Classification, commits and async jobs run on
+    batcher and job threads (or the inference server), so in the profile they appear as
+    time waiting on a Future; use crisisinfo_stage_seconds for those stages.
+    """
+    from flask import g, request
+
+    if not Config.PROFILE_REQUESTS and not Config.PROFILE_ON_HEADER:
+        return
+
+    lock = threading.Lock()  # cProfile allows one active profiler per process
+
+    @app.before_request
+    def start_profile():
+        wanted = Config.PROFILE_REQUESTS or (Config.PROFILE_ON_HEADER and request.headers.get("X-Profile") == "1")
+        if not wanted or not lock.acquire(blocking=False):
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.teardown_request
+    def stop_profile(exc=None):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return
+        profiler.disable()
+        lock.release()
+
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        name = request.path.strip("/").replace("/", "_") or "root"
+        path = os.path.join(Config.PROFILE_DIR, f"{name}-{os.getpid()}-{time.time():.0f}.prof")
+        profiler.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        print(f"Profile for {request.method} {request.path} saved to {path}\n{out.getvalue()}")
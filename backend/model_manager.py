@@ -1,54 +1,273 @@
+import gc
 import os
 import logging
+import threading
+import time
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 
+import metrics
+
+# Global manager instance so every request shares the same warm models
+_manager_instance = None
+_manager_lock = threading.Lock()
+
+def get_model_manager():
+    """Get or create the process-wide model manager"""
+    global _manager_instance
+    if _manager_instance is None:
+        with _manager_lock:
+            if _manager_instance is None:
+                from config import Config
+                manager = ModelManager(Config)
+                manager.load_models()
+                _manager_instance = manager
+    return _manager_instance
+
+def preload_shared_models():
+    """Load every model in the gunicorn master so forked workers share one copy of the weights.
+
+    Parameters are moved into shared memory, so workers map the same pages instead of
+    copying them on first touch, and the loaded objects are frozen out of the GC so
+    collections in workers don't dirty their pages either.
+    """
+    from rag_backend import get_model
+
+    manager = get_model_manager()
+    # onnxruntime sessions hold their own buffers; only torch modules can be shared
+    modules = [m for m in manager.models.values() if isinstance(m, torch.nn.Module)] + [get_model()]
+    for module in modules:
+        if next(module.parameters()).device.type == "cpu":
+            module.share_memory()
+    gc.collect()
+    gc.freeze()
+    logging.info(f"Preloaded {len(modules)} models into shared memory")
+
+def configure_worker_threads(workers):
+    """Cap torch intra-op threads so N workers don't oversubscribe the CPUs"""
+    from config import Config
+    threads = Config.TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // max(1, workers))
+    torch.set_num_threads(threads)
+    return threads
+
+def select_device():
+    """Pick the fastest available torch device"""
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+class TorchRunner:
+    """Runs a PyTorch sequence classifier; also used for the dynamically quantized int8 model"""
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, inputs):
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            return self.model(**inputs).logits.float().cpu().numpy()
+
+class OnnxRunner:
+    """Runs an exported ONNX classifier on onnxruntime's CPU provider"""
+
+    def __init__(self, onnx_path):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.model = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.model.get_inputs()]
+
+    def __call__(self, inputs):
+        feed = {name: inputs[name].numpy() for name in self.input_names if name in inputs}
+        return self.model.run(None, feed)[0]
+
+# Positional order of BertForSequenceClassification.forward; the tokenizer's key order differs
+ONNX_INPUT_ORDER = ("input_ids", "attention_mask", "token_type_ids")
+
+def export_onnx(model, tokenizer, onnx_path):
+    """Export a sequence classifier with dynamic batch and sequence axes"""
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ONNX_INPUT_ORDER if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    model.eval()
+    # Workers may load concurrently; write aside and swap in so nobody reads a partial file
+    tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in input_names),
+        tmp_path,
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+    os.replace(tmp_path, onnx_path)
+    logging.info(f"Exported ONNX model to {onnx_path}")
+
 class ModelManager:
-    def __init__(self, config):
+    BACKENDS = ('torch', 'quantized', 'onnx')
+
+    def __init__(self, config, backend=None):
         self.config = config
-        self.models = {}
-        self.tokenizers = {}
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        
+        self.backend = backend or getattr(config, 'INFERENCE_BACKEND', 'torch')
+        if self.backend not in self.BACKENDS:
+            raise ValueError(f"Unknown inference backend '{self.backend}', expected one of {self.BACKENDS}")
+        # model_type -> (tokenizer, runner); replaced as a whole on reload
+        self._entries = {}
+        self._reload_lock = threading.Lock()
+        # int8 quantization and onnxruntime are CPU-only
+        self.device = select_device() if self.backend == 'torch' else torch.device("cpu")
+
+    @property
+    def models(self):
+        return {name: runner.model for name, (_, runner) in self._entries.items()}
+
+    @property
+    def tokenizers(self):
+        return {name: tokenizer for name, (tokenizer, _) in self._entries.items()}
+
+    def _load_entry(self, model_path):
+        with metrics.observe("model_load"):
+            return self._build_entry(model_path)
+
+    def _build_entry(self, model_path):
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        if self.backend == 'onnx':
+            onnx_path = os.path.join(model_path, "model.onnx")
+            if not os.path.exists(onnx_path):
+                export_onnx(AutoModelForSequenceClassification.from_pretrained(model_path), tokenizer, onnx_path)
+            return tokenizer, OnnxRunner(onnx_path)
+
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        model.eval()
+        if self.backend == 'quantized':
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.to(self.device)
+        return tokenizer, TorchRunner(model, self.device)
+
     def load_models(self):
         """Load all required models"""
         try:
+            entries = {}
+
             # Load binary classification model
             binary_model_path = self.config.BINARY_MODEL_PATH
             if os.path.exists(binary_model_path):
-                self.models['binary'] = AutoModelForSequenceClassification.from_pretrained(binary_model_path)
-                self.tokenizers['binary'] = AutoTokenizer.from_pretrained(binary_model_path)
-                self.models['binary'].to(self.device)
-                self.models['binary'].eval()
-                logging.info(f"Binary model loaded from {binary_model_path}")
+                entries['binary'] = self._load_entry(binary_model_path)
+                logging.info(f"Binary model loaded from {binary_model_path} ({self.backend})")
             else:
                 logging.warning(f"Binary model not found at {binary_model_path}")
-            
+
             # Load multi-class model
             multi_class_model_path = self.config.MULTI_CLASS_MODEL_PATH
             if os.path.exists(multi_class_model_path):
-                self.models['multi_class'] = AutoModelForSequenceClassification.from_pretrained(multi_class_model_path)
-                self.tokenizers['multi_class'] = AutoTokenizer.from_pretrained(multi_class_model_path)
-                self.models['multi_class'].to(self.device)
-                self.models['multi_class'].eval()
-                logging.info(f"Multi-class model loaded from {multi_class_model_path}")
+                entries['multi_class'] = self._load_entry(multi_class_model_path)
+                logging.info(f"Multi-class model loaded from {multi_class_model_path} ({self.backend})")
             else:
                 logging.warning(f"Multi-class model not found at {multi_class_model_path}")
-                
+
+            # Swap in one assignment so readers never see a half-loaded set
+            self._entries = entries
+
         except Exception as e:
             logging.error(f"Error loading models: {e}")
             raise
-    
+
     def get_model(self, model_type):
         """Get a specific model"""
-        return self.models.get(model_type)
-    
+        entry = self._entries.get(model_type)
+        return entry[1].model if entry else None
+
     def get_tokenizer(self, model_type):
         """Get a specific tokenizer"""
-        return self.tokenizers.get(model_type)
-    
+        entry = self._entries.get(model_type)
+        return entry[0] if entry else None
+
+    def logits(self, model_type, texts, max_length=128):
+        """Return the raw logits (numpy, one row per text)"""
+        # Take one snapshot so a concurrent reload can't mix tokenizer and model
+        entry = self._entries.get(model_type)
+        if entry is None:
+            raise RuntimeError(f"Model '{model_type}' is not loaded")
+        tokenizer, runner = entry
+
+        with metrics.observe("tokenize"):
+            inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=max_length)
+        with metrics.observe(f"classify_{model_type}"):
+            return runner(inputs)
+
+    def predict(self, model_type, texts, max_length=128):
+        """Return the predicted class index for each text"""
+        return self.logits(model_type, texts, max_length=max_length).argmax(axis=1).tolist()
+
+    def predict_batch(self, model_type, texts, batch_size=64, max_length=128):
+        """Predict in chunks of batch_size, grouping similar lengths to keep padding small"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        preds = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            chunk_preds = self.predict(model_type, [texts[i] for i in chunk], max_length=max_length)
+            for i, pred in zip(chunk, chunk_preds):
+                preds[i] = pred
+        return preds
+
     def reload_models(self):
         """Reload all models"""
-        logging.info("Reloading models...")
-        self.load_models()
-        logging.info("Models reloaded successfully")
+        # Serialize reloads; in-flight requests keep using the old snapshot
+        with self._reload_lock:
+            logging.info("Reloading models...")
+            self.load_models()
+            logging.info("Models reloaded successfully")
+
+def check_parity(config, samples, backend=None, batch_size=32):
+    """Compare predicted labels and latency of a backend against the FP32 torch models"""
+    reference = ModelManager(config, backend='torch')
+    candidate = ModelManager(config, backend=backend or config.INFERENCE_BACKEND)
+    reference.load_models()
+    candidate.load_models()
+
+    report = {}
+    for model_type in reference.models:
+        timings = {}
+        preds = {}
+        for name, manager in (('reference', reference), ('candidate', candidate)):
+            start = time.perf_counter()
+            preds[name] = manager.predict_batch(model_type, samples, batch_size=batch_size)
+            timings[name] = (time.perf_counter() - start) * 1000 / max(1, len(samples))
+
+        mismatches = [i for i, (a, b) in enumerate(zip(preds['reference'], preds['candidate'])) if a != b]
+        report[model_type] = {
+            'samples': len(samples),
+            'agreement': 1 - len(mismatches) / max(1, len(samples)),
+            'mismatched_samples': mismatches[:20],
+            'reference_ms_per_tweet': round(timings['reference'], 3),
+            'candidate_ms_per_tweet': round(timings['candidate'], 3),
+            'speedup': round(timings['reference'] / timings['candidate'], 2) if timings['candidate'] else None,
+        }
+    return report
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Check that a CPU inference backend predicts the same labels as FP32")
+    parser.add_argument("command", choices=["parity"])
+    parser.add_argument("samples", help="Text file with one sample tweet per line")
+    parser.add_argument("--backend", choices=ModelManager.BACKENDS[1:], default=None)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    with open(args.samples, "r", encoding="utf-8") as f:
+        samples = [line.strip() for line in f if line.strip()]
+    report = check_parity(Config, samples, backend=args.backend)
+    print(json.dumps(report, indent=2))
+    if any(r['agreement'] < args.min_agreement for r in report.values()):
+        raise SystemExit(1)
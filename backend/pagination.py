@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+
+# Orderings a listing can be paged by; each maps to an EventIndex sort key
+ORDER_CREATED = 'created'
+ORDER_UPDATED = 'updated'
+
+
+def encode_cursor(order, key):
+    """Opaque cursor pointing just past the given sort key"""
+    raw = json.dumps({"o": order, "k": list(key)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (order, key) from a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        order, key = data["o"], tuple(data["k"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if order not in (ORDER_CREATED, ORDER_UPDATED) or len(key) != 2:
+        raise ValueError("Invalid cursor")
+    return order, key
+
+
+def parse_since(value):
+    """Normalize an ISO-8601 timestamp to the naive local form events are stamped with.
+
+    Raises ValueError if value is not ISO-8601.
+    """
+    since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if since.tzinfo is not None:
+        since = since.astimezone().replace(tzinfo=None)
+    return since.isoformat()
+
+
+def since_key(since):
+    """Updated-order key just past every event stamped at or before since"""
+    return (since, "\uffff")
+
+
+def parse_fields(value):
+    """Turn a fields=a,b,c parameter into a list, or None for all fields"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def project(event, fields):
+    if fields is None:
+        return event
+    return {field: event[field] for field in fields if field in event}
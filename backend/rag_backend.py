@@ -1,9 +1,20 @@
 import chromadb
+from chromadb.api.client import SharedSystemClient
 from uuid import uuid4
 import json
-from sentence_transformers import SentenceTransformer
 import os
+from sentence_transformers import SentenceTransformer
 import threading
+import time
+from config import Config
+from event_store import open_event_store
+from event_index import EventIndex, normalize_location, split_locations
+from hot_index import ANY_LOCATION, HotEventIndex
+from batcher import MicroBatcher
+import metrics
+from pagination import ORDER_CREATED
+from inference_server import get_inference_client
+from datetime import datetime
 
 # Global model instance to prevent multiple downloads
 _model_instance = None
@@ -16,26 +27,158 @@ def get_model():
         with _model_lock:
             if _model_instance is None:
                 print("Loading sentence transformer model...")
-                _model_instance = SentenceTransformer('all-MiniLM-L6-v2')
+                with metrics.observe("model_load"):
+                    _model_instance = SentenceTransformer('all-MiniLM-L6-v2')
                 print("Model loaded successfully")
     return _model_instance
 
+_UNKNOWN = {"", "unknown", "none", "n/a", "null"}
+
+def _known(value):
+    value = normalize_location(value) if value is not None else ""
+    return None if value in _UNKNOWN else value
+
+def _epoch(iso_timestamp):
+    try:
+        return datetime.fromisoformat(iso_timestamp).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+# Bump when event_metadata changes so stored collections are backfilled on startup
+METADATA_VERSION = 2
+
+def event_metadata(doc):
+    """Chroma metadata used to narrow similarity search: type, last update and one flag per location"""
+    metadata = {
+        "event_type": _known(doc.get("event_type")) or "unknown",
+        "updated_at": _epoch(doc.get("timestamp")),
+        "metadata_version": METADATA_VERSION,
+    }
+    for name in split_locations(doc.get("locations")):
+        key = _known(name)
+        if key:
+            metadata["loc:" + key] = True
+    if not any(key.startswith("loc:") for key in metadata):
+        # No known location yet: a later report that resolves one may still merge into it
+        metadata[ANY_LOCATION] = True
+    return metadata
+
+def match_criteria(event, window_hours):
+    """Which stored events a new event may be merged into"""
+    locations = [_known(name) for name in split_locations(event.get("locations"))]
+    return {
+        "event_type": _known(event.get("event_type")),
+        "since": time.time() - window_hours * 3600 if window_hours else None,
+        "locations": ["loc:" + key for key in locations if key],
+    }
+
+def _compact_vector(embedding):
+    return [round(float(x), 6) for x in embedding]
+
+def chroma_where(criteria):
+    """Chroma where clause for match_criteria; None when nothing is known to filter on"""
+    clauses = []
+    if criteria["event_type"]:
+        clauses.append({"event_type": criteria["event_type"]})
+    if criteria["since"]:
+        clauses.append({"updated_at": {"$gte": criteria["since"]}})
+    locations = [{key: True} for key in criteria["locations"]]
+    if locations:
+        locations.append({ANY_LOCATION: True})
+    if len(locations) == 1:
+        clauses.append(locations[0])
+    elif locations:
+        clauses.append({"$or": locations})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
 class RAGBackend:
-    def __init__(self, json_path="events.json", db_path="./chroma_db", collection_name="events"):
-        self.json_path = json_path
-        self.db_path = db_path
+    def __init__(self, json_path=None, db_path=None, collection_name="events"):
+        self.json_path = json_path or Config.EVENT_STORE_PATH
+        self.db_path = db_path or Config.CHROMA_DB_PATH
         self.collection_name = collection_name
 
         # Use lazy loading for model
         self._model = None
         self.similarity_threshold = 0.6  # Adjust as needed
+        self.match_window_hours = Config.DEDUP_TIME_WINDOW_HOURS
+        self.hot_index = HotEventIndex(max_entries=Config.HOT_INDEX_SIZE)
+        # Ids other workers wrote since the embedded collection was opened (see _reopen_if_missing)
+        self._chroma_stale = set()
+        self._chroma_reload = False
+
+        # Loading document store; doc_index (id -> document) keeps store order
+        self.lock = threading.RLock()
+        # Called as listener(records, version) by refresh(); records is None after a full reload
+        self.listeners = []
+        self.store = open_event_store(Config, json_path=self.json_path)
+        self._load_documents()
 
-        # Loading document store
-        self.documents = self.load_or_create_json_store()
+        # Matches and writes from every request thread are grouped into one commit
+        self._committer = MicroBatcher(
+            self._commit,
+            max_batch_size=Config.COMMIT_MAX_BATCH,
+            max_wait_ms=Config.COMMIT_MAX_WAIT_MS,
+            name="rag-commit",
+            eager=True,
+        )
 
-        # Initializing Chroma DB
-        client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection = client.get_or_create_collection("events")
+        # Initializing Chroma DB; every access happens under the store's write lock
+        with self.store.locked():
+            self._open_collection()
+            self._backfill_metadata()
+
+    def _open_collection(self):
+        if Config.CHROMA_SERVER_HOST:
+            # One server-side index shared by every worker
+            client = chromadb.HttpClient(host=Config.CHROMA_SERVER_HOST, port=Config.CHROMA_SERVER_PORT)
+        else:
+            # The embedded HNSW index lives in process memory; a fresh client replays the
+            # writes other workers added to Chroma's SQLite queue since it was last opened
+            SharedSystemClient.clear_system_cache()
+            client = chromadb.PersistentClient(path=self.db_path)
+        self.collection = client.get_or_create_collection(self.collection_name)
+        self._chroma_stale.clear()
+        self._chroma_reload = False
+
+    def _reopen_if_missing(self):
+        """Reopen the embedded collection only when a query could miss other workers' vectors.
+
+        Their adds and updates reach the hot index through the log and are matched there
+        first, so a reload is needed only once one of them has left the hot index, or
+        after another worker's delete or a full store reload. Call with the store's write
+        lock held.
+        """
+        if Config.CHROMA_SERVER_HOST:
+            return
+        if self._chroma_reload or any(doc_id not in self.hot_index for doc_id in self._chroma_stale):
+            self._open_collection()
+
+    def _backfill_metadata(self, chunk_size=500):
+        # Collections written before the current metadata (or with none) are updated so filtered search sees them
+        sample = self.collection.get(limit=1, include=["metadatas"])
+        if not sample["ids"]:
+            return
+        metadata = (sample["metadatas"] or [None])[0] or {}
+        if metadata.get("metadata_version") == METADATA_VERSION:
+            return
+        with self.lock:
+            docs = self.documents
+        print(f"Adding search metadata to {len(docs)} stored events...")
+        for start in range(0, len(docs), chunk_size):
+            chunk = docs[start:start + chunk_size]
+            self.collection.update(ids=[doc["id"] for doc in chunk], metadatas=[event_metadata(doc) for doc in chunk])
+
+    @property
+    def documents(self):
+        return list(self.doc_index.values())
+
+    @property
+    def version(self):
+        """Store version; changes on every add, update or delete from any worker"""
+        return self.store.seq
 
     @property
     def model(self):
@@ -44,84 +187,284 @@ class RAGBackend:
             self._model = get_model()
         return self._model
 
-    def load_or_create_json_store(self):
-        if os.path.exists(self.json_path):
-            with open(self.json_path, "r") as f:
-                return json.load(f)
-        else:
-            with open(self.json_path, "w") as f:
-                json.dump([],f)
-            return []
-        
-    def save_json_store(self):
-        with open(self.json_path, "w") as f:
-            json.dump(self.documents, f, indent=2)
+    def _load_documents(self):
+        self.doc_index = {}
+        self.event_index = EventIndex()
+        for doc in self.store.load():
+            self._put(doc)
 
-    def add_document(self, event: dict):
-        doc_id = str(uuid4())
-        event["id"] = doc_id
+    def _put(self, doc):
+        # Every document change goes through here so the secondary indexes stay in step
+        old = self.doc_index.get(doc["id"])
+        if old is not None:
+            self.event_index.remove(old, keep_order=True)
+        self.doc_index[doc["id"]] = doc
+        self.event_index.add(doc)
 
-        self.documents.append(event)
-        self.save_json_store()
+    def _drop(self, doc_id):
+        old = self.doc_index.pop(doc_id, None)
+        if old is not None:
+            self.event_index.remove(old)
+        return old
 
-        summary = event.get("summary", "")
-        self.collection.add(documents=[summary], ids=[doc_id])
+    def embed(self, summary):
+        """Embed a summary with the shared sentence transformer"""
+        return self.encode([summary])[0]
+
+    def encode(self, summaries):
+        """Embed a list of summaries, on the inference server when one is configured"""
+        client = get_inference_client()
+        with metrics.observe("embed"):
+            if client:
+                return client.embed(summaries)
+            return self.model.encode(summaries).tolist()
+
+    def _apply_writes(self, writes):
+        """Persist (op, doc, embedding) adds/updates: one log append, one Chroma upsert, then memory.
+
+        Lock order is store write lock, then self.lock; never call this holding self.lock.
+        """
+        if not writes:
+            return
+        # Last write per id wins within the batch
+        latest = {doc["id"]: (doc, embedding) for _, doc, embedding in writes}
+        with self.store.locked():
+            # Embeddings ride along in the log so other workers can fill their hot indexes;
+            # writer tells them which records their embedded Chroma hasn't seen
+            records = [
+                {"op": op, "id": doc["id"], "doc": doc, "embedding": _compact_vector(embedding), "writer": os.getpid()}
+                for op, doc, embedding in writes
+            ]
+            with metrics.observe("store_persist"):
+                self.store.append_many(records)
+            # Pass our own vectors so Chroma never embeds with its default model
+            with metrics.observe("chroma_write"):
+                self.collection.upsert(
+                    ids=list(latest),
+                    embeddings=[embedding for _, embedding in latest.values()],
+                    documents=[doc.get("summary", "") for doc, _ in latest.values()],
+                    metadatas=[event_metadata(doc) for doc, _ in latest.values()],
+                )
+        with self.lock:
+            for _, doc, _ in writes:
+                self._put(doc)
+        for doc_id, (doc, embedding) in latest.items():
+            self.hot_index.put(doc_id, embedding, event_metadata(doc))
+
+    def add_document(self, event: dict, embedding=None):
+        if embedding is None:
+            embedding = self.embed(event.get("summary", ""))
+        doc_id = str(uuid4())
+        event["id"] = doc_id
+        # Stamped under the lock so timestamps follow commit order and `since` polling can't miss it
+        with self.store.locked():
+            event["timestamp"] = event["created_at"] = datetime.now().isoformat()
+            self._apply_writes([("add", event, embedding)])
         return doc_id
 
-    def update_document(self, doc_id, new_event: dict):
-        found = False
-        for i, doc in enumerate(self.documents):
-            if doc["id"] == doc_id:
-                self.documents[i] = {**new_event, "id": doc_id}
-                found = True
-                break
+    def refresh(self):
+        """Pull mutations written by other workers into this process's view"""
+        with self.lock:
+            records = self.store.poll()
+            if records is None:
+                self._chroma_reload = True
+                self._load_documents()
+                for doc_id in self.hot_index.ids():
+                    if doc_id not in self.doc_index:
+                        self.hot_index.discard(doc_id)
+                self._notify(None)
+                return True
+            for record in records:
+                foreign = record.get("writer") != os.getpid()
+                if record.get("op") in ("add", "update"):
+                    if foreign:
+                        self._chroma_stale.add(record["id"])
+                    current = self.doc_index.get(record["id"])
+                    if record.get("embedding") is not None:
+                        self.hot_index.put(record["id"], record["embedding"], event_metadata(record["doc"]))
+                    elif current is not None and current.get("timestamp") != record["doc"].get("timestamp"):
+                        # Updated by another worker; our cached vector is stale
+                        self.hot_index.discard(record["id"])
+                    self._put(record["doc"])
+                elif record.get("op") == "delete":
+                    if foreign:
+                        self._chroma_reload = True
+                    self._drop(record["id"])
+                    self.hot_index.discard(record["id"])
+            if records:
+                self._notify(records)
+            return bool(records)
 
-        if not found:
-            return False
+    def _notify(self, records):
+        for listener in self.listeners:
+            try:
+                listener(records, self.version)
+            except Exception as e:
+                print(f"Error in event listener: {e}")
 
-        self.save_json_store()
+    def get_document(self, doc_id):
+        return self.doc_index.get(doc_id)
 
-        summary = new_event.get("summary", "")
-        self.collection.update(ids=[doc_id], documents=[summary])
+    def update_document(self, doc_id, new_event: dict, embedding=None):
+        if embedding is None:
+            embedding = self.embed(new_event.get("summary", ""))
+        with self.store.locked():
+            self.refresh()
+            old = self.doc_index.get(doc_id)
+            if old is None:
+                return False
+            doc = {**new_event, "id": doc_id, "created_at": old.get("created_at"), "timestamp": datetime.now().isoformat()}
+            self._apply_writes([("update", doc, embedding)])
         return True
     
     def delete_document(self, doc_id):
-        before = len(self.documents)
-        self.documents = [doc for doc in self.documents if doc["id"]!=doc_id]
-        after = len(self.documents)
-        if before == after:
-            return False
+        with self.store.locked():
+            self.refresh()
+            if doc_id not in self.doc_index:
+                return False
+            with metrics.observe("store_persist"):
+                self.store.append_many([{"op": "delete", "id": doc_id, "writer": os.getpid()}])
+            with metrics.observe("chroma_write"):
+                self.collection.delete(ids=[doc_id])
         
-        self.save_json_store()
-        self.collection.delete(ids=[doc_id])
+        with self.lock:
+            self._drop(doc_id)
+        self.hot_index.discard(doc_id)
         return True
     
-    def search_similar_event(self, summary, top_k=1):
-        embedding = self.model.encode(summary)
-        results = self.collection.query(query_embeddings=[embedding], n_results=top_k)
+    def query_events(self, category=None, event_type=None, location=None):
+        """Documents matching the given filters, in store order"""
+        with self.lock:
+            ids = self.event_index.query(category=category, event_type=event_type, location=location)
+            if ids is None:
+                return self.documents
+            return [self.doc_index[doc_id] for doc_id in ids]
+
+    def page_events(self, order=ORDER_CREATED, after=None, limit=100, category=None, event_type=None, location=None):
+        """One page of documents; returns (documents, last_key, has_more)"""
+        with self.lock:
+            ids = self.event_index.query(category=category, event_type=event_type, location=location)
+            page_ids, last_key, has_more = self.event_index.page(order, after=after, limit=limit, ids=ids)
+            return [self.doc_index[doc_id] for doc_id in page_ids], last_key, has_more
+
+    def facets(self):
+        """Distinct categories, event types and locations from the indexes"""
+        with self.lock:
+            return {
+                "categories": self.event_index.categories(),
+                "event_types": self.event_index.event_types(),
+                "locations": self.event_index.locations(),
+            }
+
+    def last_updated(self):
+        """Timestamp of the most recently added or updated event, or None"""
+        with self.lock:
+            keys = self.event_index.updated_keys
+            return (keys[-1][0] or None) if keys else None
+
+    def search_similar_event(self, summary, top_k=1, embedding=None, event=None, pending=None):
+        """Closest stored event, restricted to event's type, locations and the match window.
+
+        Recent events in the in-memory hot index (and pending, uncommitted ones) are tried
+        first; Chroma is only queried when none of them is within the similarity threshold.
+        Call with the store's write lock held.
+        """
+        if embedding is None:
+            embedding = self.embed(summary)
+        criteria = match_criteria(event or {}, self.match_window_hours)
+
+        best = None
+        for index in (pending, self.hot_index):
+            hit = index.nearest(embedding, criteria) if index is not None else None
+            if hit and hit[1] < self.similarity_threshold and (best is None or hit[1] < best[1]):
+                best = hit
+        if best:
+            return {"id": best[0], "distance": best[1], "source": "hot"}
+
+        self._reopen_if_missing()
+        with metrics.observe("chroma_query"):
+            results = self.collection.query(query_embeddings=[embedding], n_results=top_k, where=chroma_where(criteria))
         ids = results.get("ids", [[]])[0]
         distances = results.get("distances", [[]])[0]
         if ids and distances:
             return {"id": ids[0], "distance": distances[0]}
         return None
 
-    def process_event(self, event: dict):
+    def _parse_event(self, event):
         if isinstance(event, str):
             try:
                 event = json.loads(event)
-                print(type(event))
             except json.JSONDecodeError:
                 raise ValueError("Invalid JSON string passed to process_event")
         summary = event.get("summary", "")
         if not summary:
             raise ValueError("Event must include a summary field")
+        return event
 
-        result = self.search_similar_event(summary, top_k=1)
-        print("result found:", result)
+    def _commit(self, items):
+        """Match and write a batch of (event, embedding) pairs as one commit.
 
-        if result and result["distance"] < self.similarity_threshold:
-            self.update_document(result["id"], event)
-            return {"action": "updated", "id": result["id"], "distance": result["distance"]}
-        else:
-            new_id = self.add_document(event)
-            return {"action": "added", "id": new_id}
\ No newline at end of file
+        Runs on the committer thread with the store's cross-process write lock held. The
+        store is brought up to date with other workers' writes first (their vectors land in
+        the hot index), so add-vs-update is decided against every committed event.
+        """
+        results = []
+        writes = []
+        batch_docs = {}
+        # Events earlier in this batch aren't in Chroma yet but must still be matched
+        pending = HotEventIndex(max_entries=len(items))
+        with self.store.locked():
+            self.refresh()
+            now = datetime.now().isoformat()
+            for event, embedding in items:
+                result = self.search_similar_event(event["summary"], embedding=embedding, event=event, pending=pending)
+                print("result found:", result)
+
+                old = None
+                if result and result["distance"] < self.similarity_threshold:
+                    old = batch_docs.get(result["id"]) or self.get_document(result["id"])
+                if old is not None:
+                    doc = {**event, "id": old["id"], "created_at": old.get("created_at"), "timestamp": now}
+                    writes.append(("update", doc, embedding))
+                    results.append({"action": "updated", "id": doc["id"], "distance": result["distance"]})
+                else:
+                    doc = {**event, "id": str(uuid4()), "created_at": now, "timestamp": now}
+                    writes.append(("add", doc, embedding))
+                    results.append({"action": "added", "id": doc["id"]})
+                batch_docs[doc["id"]] = doc
+                pending.put(doc["id"], embedding, event_metadata(doc))
+            self._apply_writes(writes)
+
+        for result in results:
+            metrics.count_event(result["action"])
+        return results
+
+    def _store_event(self, event, embedding):
+        return self._committer.submit((event, embedding)).result()
+
+    def process_event(self, event: dict):
+        event = self._parse_event(event)
+        # One encode per event, shared by the lookup and the write
+        embedding = self.embed(event["summary"])
+        return self._store_event(event, embedding)
+
+    def process_events(self, events):
+        """process_event for a batch, embedding every summary in one encode call.
+
+        Returns one result per input; events that fail to parse get {"error": ...}.
+        """
+        results = [None] * len(events)
+        parsed = []
+        for i, event in enumerate(events):
+            try:
+                parsed.append((i, self._parse_event(event)))
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+
+        if parsed:
+            embeddings = self.encode([event["summary"] for _, event in parsed])
+            # Submitted together so they share commits; later events still match earlier ones
+            futures = [(i, self._committer.submit((event, embedding))) for (i, event), embedding in zip(parsed, embeddings)]
+            for i, future in futures:
+                results[i] = future.result()
+        return results
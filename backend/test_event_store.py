@@ -0,0 +1,99 @@
+import json
+
+from event_store import EventLog
+
+
+def open_log(path, **kwargs):
+    kwargs.setdefault("fsync_policy", "never")
+    kwargs.setdefault("compact_interval", 3600)
+    return EventLog(str(path), **kwargs)
+
+
+def event(doc_id, summary):
+    return {"id": doc_id, "summary": summary}
+
+
+def test_replay_applies_adds_updates_and_deletes(tmp_path):
+    log = open_log(tmp_path / "events.log.jsonl")
+    log.load()
+    log.append("add", "a", event("a", "Flooding downtown"))
+    log.append("add", "b", event("b", "Bridge closed"))
+    log.append("update", "a", event("a", "Flooding downtown, shelters open"))
+    log.append("delete", "b")
+
+    docs = open_log(tmp_path / "events.log.jsonl").load()
+
+    assert docs == [event("a", "Flooding downtown, shelters open")]
+
+
+def test_replay_skips_a_torn_tail_and_keeps_appending(tmp_path):
+    path = tmp_path / "events.log.jsonl"
+    log = open_log(path)
+    log.load()
+    log.append("add", "a", event("a", "Power outage"))
+    # A crash mid-write leaves a partial last line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 99, "op": "add", "id": "torn", "doc": {"id": "to')
+
+    reopened = open_log(path)
+    assert reopened.load() == [event("a", "Power outage")]
+
+    reopened.append("add", "b", event("b", "Road blocked"))
+    docs = open_log(path).load()
+
+    assert docs == [event("a", "Power outage"), event("b", "Road blocked")]
+
+
+def test_replay_after_compaction_keeps_live_documents_and_seq(tmp_path):
+    path = tmp_path / "events.log.jsonl"
+    log = open_log(path)
+    log.load()
+    for i in range(5):
+        log.append("add", f"e{i}", event(f"e{i}", f"Report {i}"))
+    for i in range(5):
+        log.append("update", "e0", event("e0", f"Report 0, revision {i}"))
+    log.append("delete", "e4")
+    seq_before = log.seq
+
+    log.compact()
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 5  # checkpoint plus one add per live event
+    docs = open_log(path).load()
+    assert [doc["id"] for doc in docs] == ["e0", "e1", "e2", "e3"]
+    assert docs[0]["summary"] == "Report 0, revision 4"
+
+    log.append("add", "e5", event("e5", "New report"))
+    assert log.seq == seq_before + 1
+
+
+def test_tailing_reader_sees_appends_and_is_told_to_reload_after_compaction(tmp_path):
+    path = tmp_path / "events.log.jsonl"
+    writer = open_log(path)
+    writer.load()
+    reader = open_log(path)
+    reader.load()
+
+    writer.append("add", "a", event("a", "Wildfire north of town"))
+    records = reader.poll()
+    assert [(record["op"], record["id"]) for record in records] == [("add", "a")]
+
+    writer.compact()
+    assert reader.poll() is None
+    assert [doc["id"] for doc in reader.load()] == ["a"]
+
+
+def test_writers_never_reuse_a_seq(tmp_path):
+    path = tmp_path / "events.log.jsonl"
+    first, second = open_log(path), open_log(path)
+    first.load()
+    second.load()
+
+    for i in range(10):
+        (first if i % 2 else second).append("add", f"e{i}", event(f"e{i}", "Report"))
+
+    with open(path, encoding="utf-8") as f:
+        seqs = [json.loads(line)["seq"] for line in f][1:]
+    assert seqs == sorted(set(seqs))
+    assert len(seqs) == 10
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import ingest
+
+
+class FakeRAG:
+    """Stands in for RAGBackend: every stored event gets a new id"""
+
+    def __init__(self):
+        self.stored = []
+
+    def process_events(self, events):
+        results = []
+        for event in events:
+            self.stored.append(event)
+            results.append({"action": "added", "id": f"event-{len(self.stored)}"})
+        return results
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    classified = []
+
+    def categorize(tweets):
+        classified.extend(tweets)
+        if any("boom" in tweet for tweet in tweets):
+            raise RuntimeError("classifier unavailable")
+        return [("informative", "infrastructure_and_utility_damage") for _ in tweets]
+
+    monkeypatch.setattr(ingest, "categorize_tweets", categorize)
+    monkeypatch.setattr(ingest, "call_gpt_extractor", lambda prompt: {"summary": prompt})
+    pipe = ingest.IngestPipeline(FakeRAG(), batch_size=8, extract_workers=2, queue_size=16)
+    pipe.classified = classified
+    return pipe
+
+
+def run(pipe, tweets):
+    return {index: result for index, _, result in pipe.run(enumerate(tweets))}
+
+
+def test_duplicates_in_a_batch_are_classified_once(pipeline):
+    results = run(pipeline, ["Bridge collapsed on Main St", "Bridge collapsed on Main St", "Power out downtown"])
+
+    assert sorted(results) == [0, 1, 2]
+    assert pipeline.classified.count("Bridge collapsed on Main St") == 1
+    assert results[0]["action"] == "added"
+    assert results[1] == {"action": "duplicate", "id": results[0]["id"]}
+    assert len(pipeline.rag.stored) == 2
+
+
+def test_failing_stage_finishes_every_tweet(pipeline):
+    results = run(pipeline, ["boom at the plant", "boom at the plant", "Road closed", "boom at the plant"])
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(result == {"error": "classifier unavailable"} for result in results.values())
+
+
+def test_malformed_lines_become_error_results(pipeline, tmp_path):
+    path = tmp_path / "tweets.jsonl"
+    path.write_text('{"tweet": "Flooding on 5th Ave"}\n{not json\n{"id": 3}\n[1, 2]\n\n', encoding="utf-8")
+
+    results = {index: result for index, _, result in pipeline.run(ingest.read_tweets(str(path)))}
+
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert results[0]["action"] == "added"
+    assert "not valid JSON" in results[1]["error"]
+    assert "no tweet or text field" in results[2]["error"]
+    assert "no tweet or text field" in results[3]["error"]
+    assert results[4] == {"error": "Empty tweet"}
+
+
+def test_failing_input_still_ends_the_run(pipeline):
+    def tweets():
+        yield 0, "Shelter open at the school"
+        raise OSError("disk went away")
+
+    results = {index: result for index, _, result in pipeline.run(tweets())}
+
+    assert list(results) == [0]
+
+
+def test_checkpointed_resumes_after_the_watermark(pipeline, tmp_path):
+    checkpoint = ingest.Checkpoint(str(tmp_path / "tweets.checkpoint.json"))
+    output = tmp_path / "tweets.results.jsonl"
+    tweets = ["Fire near the station", "Trees down on Elm", "Water main burst"]
+
+    with open(output, "w", encoding="utf-8") as out:
+        list(ingest.checkpointed(pipeline.run(enumerate(tweets[:2])), out, checkpoint, flush_every=1))
+
+    resumed = ingest.Checkpoint(checkpoint.path)
+    assert resumed.watermark == 2
+    remaining = ((i, tweet) for i, tweet in enumerate(tweets) if i >= resumed.watermark)
+    with open(output, "a", encoding="utf-8") as out:
+        list(ingest.checkpointed(pipeline.run(remaining), out, resumed))
+
+    assert sorted(ingest.read_results(str(output))) == [0, 1, 2]
+    assert json.load(open(checkpoint.path))["watermark"] == 3
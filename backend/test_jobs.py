@@ -0,0 +1,60 @@
+import threading
+import time
+
+from jobs import JobQueue, JobWorkerPool
+
+
+def test_jobs_are_claimed_once_in_submission_order(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.db"))
+    first = jobs.submit({"tweet": "one"})
+    second = jobs.submit({"tweet": "two"})
+
+    assert jobs.claim() == (first, {"tweet": "one"})
+    assert jobs.claim() == (second, {"tweet": "two"})
+    assert jobs.claim() is None
+
+
+def test_expired_lease_is_handed_out_again(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.05)
+    job_id = jobs.submit({"tweet": "one"})
+    jobs.claim()
+
+    time.sleep(0.1)
+
+    assert jobs.claim() == (job_id, {"tweet": "one"})
+
+
+def test_renewed_lease_is_not_handed_out(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.2)
+    job_id = jobs.submit({"tweet": "one"})
+    jobs.claim()
+
+    time.sleep(0.1)
+    jobs.renew([job_id])
+    time.sleep(0.15)
+
+    assert jobs.claim() is None
+
+
+def test_pool_keeps_a_long_job_leased_until_it_finishes(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.15)
+    started = []
+    release = threading.Event()
+
+    def handler(payload):
+        started.append(payload["tweet"])
+        release.wait(5)
+        return {"ok": True}
+
+    pool = JobWorkerPool(jobs, handler, workers=2, poll_interval=0.01)
+    job_id = jobs.submit({"tweet": "slow"})
+    pool.start()
+
+    time.sleep(0.5)  # several lease lengths
+    release.set()
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)["status"] != "done" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert started == ["slow"]
+    assert jobs.get(job_id)["result"] == {"ok": True}
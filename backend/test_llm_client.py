@@ -0,0 +1,41 @@
+import asyncio
+
+from llm_client import LLMExtractor
+
+
+class SlowBackend:
+    """Records the most extractions it saw in flight at once"""
+
+    retryable_errors = (OSError,)
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def acomplete(self, tweet, existing_summary=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return tweet
+
+
+def test_concurrent_single_extractions_share_the_limit():
+    backend = SlowBackend()
+    extractor = LLMExtractor(backend, max_concurrency=3, cache_size=0)
+
+    async def main():
+        await asyncio.gather(*[extractor.extract_async(f"tweet {i}") for i in range(20)])
+
+    asyncio.run(main())
+    assert backend.peak == 3
+
+
+def test_each_event_loop_gets_its_own_limit():
+    backend = SlowBackend()
+    extractor = LLMExtractor(backend, max_concurrency=2, cache_size=0)
+
+    for run in range(2):
+        extractor.extract_many([f"tweet {run}-{i}" for i in range(6)])
+
+    assert backend.peak == 2
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from event_index import EventIndex
+from pagination import ORDER_CREATED, ORDER_UPDATED, decode_cursor, encode_cursor, parse_since, since_key
+
+
+def make_index(count=7):
+    index = EventIndex()
+    for i in range(count):
+        index.add({
+            "id": f"e{i}",
+            "created_at": f"2024-05-01T10:00:0{i}",
+            "timestamp": f"2024-05-01T12:00:0{i}",
+            "category": "infrastructure" if i % 2 else "rescue",
+        })
+    return index
+
+
+def walk(index, order, after=None, limit=3, ids=None):
+    """Follow cursors to the end, collecting every id"""
+    seen = []
+    while True:
+        page, last_key, has_more = index.page(order, after=after, limit=limit, ids=ids)
+        seen.extend(page)
+        if not has_more:
+            return seen
+        order, after = decode_cursor(encode_cursor(order, last_key))
+
+
+def test_cursor_pages_cover_every_event_once_in_created_order():
+    assert walk(make_index(), ORDER_CREATED) == [f"e{i}" for i in range(7)]
+
+
+def test_cursor_pages_respect_filters():
+    index = make_index()
+    ids = index.query(category="infrastructure")
+    assert walk(index, ORDER_CREATED, ids=ids, limit=2) == ["e1", "e3", "e5"]
+
+
+def test_cursor_page_after_an_update_moves_the_event_to_the_end():
+    index = make_index()
+    old = {"id": "e2", "created_at": "2024-05-01T10:00:02", "timestamp": "2024-05-01T12:00:02", "category": "rescue"}
+    index.remove(old, keep_order=True)
+    index.add({**old, "timestamp": "2024-05-01T13:00:00"})
+
+    assert walk(index, ORDER_UPDATED)[-1] == "e2"
+
+
+def test_since_returns_only_later_updates():
+    index = make_index()
+    page, _, has_more = index.page(ORDER_UPDATED, after=since_key(parse_since("2024-05-01T12:00:04")), limit=10)
+    assert page == ["e5", "e6"]
+    assert not has_more
+
+
+def test_since_accepts_dates_and_utc_offsets():
+    assert parse_since("2024-05-01") == "2024-05-01T00:00:00"
+    utc = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert parse_since("2024-05-01T12:00:00Z") == utc.astimezone().replace(tzinfo=None).isoformat()
+
+
+@pytest.mark.parametrize("value", ["yesterday", "2024-13-01", "12:00"])
+def test_since_rejects_non_iso_values(value):
+    with pytest.raises(ValueError):
+        parse_since(value)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor("sideways", ("a", "b"))])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)